@@ -0,0 +1,75 @@
+#!/usr/bin/python3
+
+# Copyright 2020 Jan-Ulrich Klar @JanUlrichKlar in GitHub
+# See LICENSE for details.
+
+"""
+    Package-wide logging and timing instrumentation.
+
+    Every module logs to logging.getLogger(__name__), i.e. below the package logger 'src', so the output
+    of all calculations is switched on or off with set_level(logging.INFO) or the usual logging configuration.
+
+    The calc methods of the contract classes are wrapped with :func:`instrumented`. Counting is off by
+    default and costs one flag check per call. It is switched on with enable() or, without touching any
+    code, by starting the process with the environment variable CFA_INSTRUMENTATION=1. stats() and
+    to_json() export the number of calls and the cumulative time per method.
+"""
+
+import functools
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger('src')
+
+_enabled = os.environ.get('CFA_INSTRUMENTATION', '0') not in ('', '0')
+_stats = {}
+
+
+def instrumented(func):
+    name = func.__module__.rsplit('.', 1)[-1] + '.' + func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record = _stats.setdefault(name, {'calls': 0, 'time': 0.0})
+            record['calls'] += 1
+            record['time'] += time.perf_counter() - start
+    return wrapper
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    _stats.clear()
+
+
+def stats():
+    # calls and cumulative time in seconds per instrumented method, nested calls are included in the caller
+    return {name: dict(record) for name, record in _stats.items()}
+
+
+def to_json(**kwargs):
+    return json.dumps(stats(), **kwargs)
+
+
+def set_level(level):
+    logger.setLevel(level)
@@ -5,6 +5,7 @@
 
 from datetime import datetime, date
 import json
+import logging
 from random import randint
 
 import pandas as pd
@@ -14,6 +15,10 @@ import sympy as sym
 
 from datetime import datetime, date
 
+from src.instrumentation import instrumented
+
+logger = logging.getLogger(__name__)
+
 
 class PrivateRealEstate:
     """
@@ -47,6 +52,7 @@ class PrivateRealEstate:
         self.portfolio = df
         self.return_symbolic = None
 
+    @instrumented
     def return_sym(self):
         port_return = sym.Symbol('')
 
@@ -56,5 +62,4 @@ class PrivateRealEstate:
                 sym.nsimplify(str(row['weight']) + '*' + str(row['b_i2']) + '*F_GDP') + \
                 sym.nsimplify(str(row['weight']) + '*' + 'eps_' + str(row['Stock']))
         self.return_symbolic = port_return
-        print(type(port_return))
-        print(str(port_return))
\ No newline at end of file
+        logger.debug('portfolio return: %s', port_return)
\ No newline at end of file
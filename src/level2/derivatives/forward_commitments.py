@@ -4,12 +4,348 @@
 # See LICENSE for details.
 
 from datetime import datetime, date
+import functools
 import json
+import logging
+import sys
 from random import randint
 
 import pandas as pd
 import numpy as np
 import sympy as sym
+from collections import OrderedDict
+
+from src.instrumentation import instrumented
+
+logger = logging.getLogger(__name__)
+
+
+_CONVENTIONS = {'compound': lambda r, t: (1 + r / 100) ** t,
+                'simple': lambda r, t: 1 + r / 100 * t,
+                'continuous': lambda r, t: np.exp(r / 100 * t)}
+
+
+class DiscountCurve:
+    """
+        A class to represent a shared, memoized discount factor service.
+
+        Accumulation factors are cached keyed by rate, days, day count and convention, so contracts
+        valued against the same market snapshot share the power computations. Scalar factors are cached
+        per (r, t) pair, arrays as a whole under their bytes, so a repeated array costs one lookup and no
+        Python loop. The cache is bounded and evicts the least recently used entries.
+
+        ...
+
+        Attributes
+        ----------
+        maxsize : int
+            maximum number of cached scalar factors and arrays
+        hits : int
+            number of factor lookups answered from the cache
+        misses : int
+            number of factor lookups that had to be calculated
+
+        Methods
+        -------
+        factor(r, t, ntd=360, convention='compound'):
+            accumulation factor for rate r in percentage over t days with ntd days per year,
+            (1 + r / 100) ** (t / ntd) for 'compound', 1 + r / 100 * t / ntd for 'simple' and
+            exp(r / 100 * t / ntd) for 'continuous'. Accepts scalars or arrays, every call counts as one
+            lookup, scalars with a NaN are calculated but not cached.
+        discount(r, t, ntd=360, convention='compound'):
+            discount factor 1 / factor(r, t, ntd, convention)
+        cache_info():
+            dict with hits, misses, maxsize and currsize
+
+
+        """
+
+    def __init__(self, maxsize=2 ** 16):
+        self.maxsize = maxsize
+        self.hits, self.misses = 0, 0
+        self._cache = OrderedDict()
+
+    def factor(self, r, t, ntd=360, convention='compound'):
+        if convention not in _CONVENTIONS:
+            raise ValueError('convention must be one of ' + ', '.join(_CONVENTIONS))
+        if _is_scalar(r) and _is_scalar(t):
+            r, t = float(r), float(t)
+            key = (r, t, ntd, convention)
+            value = self._cache.get(key)
+            if value is None:
+                value = _CONVENTIONS[convention](r, t / ntd)
+                self.misses += 1
+                # NaN keys never match, they are calculated without filling the cache
+                if r == r and t == t:
+                    self._store(key, value)
+            else:
+                self._cache.move_to_end(key)
+                self.hits += 1
+            return value
+        r, t = np.broadcast_arrays(np.asarray(r, dtype=float), np.asarray(t, dtype=float))
+        key = _ArrayKey(r, t, ntd, convention)
+        value = self._cache.get(key)
+        if value is None:
+            value = _CONVENTIONS[convention](r, t / ntd)
+            self.misses += 1
+            self._store(key.own(), value)
+        else:
+            self._cache.move_to_end(key)
+            self.hits += 1
+        return value.copy()
+
+    def discount(self, r, t, ntd=360, convention='compound'):
+        return 1 / self.factor(r, t, ntd, convention)
+
+    def cache_info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'maxsize': self.maxsize, 'currsize': len(self._cache)}
+
+    def clear(self):
+        self._cache.clear()
+        self.hits, self.misses = 0, 0
+
+    def _store(self, key, value):
+        self._cache[key] = value
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+
+def _is_scalar(x):
+    # plain Python numbers skip the slower np.ndim
+    return type(x) in (float, int) or np.ndim(x) == 0
+
+
+class _ArrayKey:
+    # cache key of a pair of rate and day arrays, hashed from a strided sample of the values and compared
+    # bit by bit, so equal snapshots match, NaN entries included, without hashing every byte
+    __slots__ = ('r', 't', 'settings', '_hash')
+
+    def __init__(self, r, t, ntd, convention):
+        self.r, self.t, self.settings = r, t, (r.shape, ntd, convention)
+        step = max(r.size // 64, 1)
+        self._hash = hash((self.settings, r.ravel()[::step].tobytes(), t.ravel()[::step].tobytes()))
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        return isinstance(other, _ArrayKey) and self._hash == other._hash and self.settings == other.settings and \
+            np.array_equal(self.r.view(np.int64), other.r.view(np.int64)) and \
+            np.array_equal(self.t.view(np.int64), other.t.view(np.int64))
+
+    def own(self):
+        # the cached key keeps copies, the caller may change its arrays later
+        self.r, self.t = self.r.copy(), self.t.copy()
+        return self
+
+
+def _factor(r, t, ntd=360, convention='compound', curve=None):
+    # accumulation factor, taken from the shared curve if a contract has one
+    if curve is not None:
+        return curve.factor(r, t, ntd, convention)
+    return _CONVENTIONS[convention](r, t / ntd)
+
+
+class YieldCurve:
+    """
+        A class to represent an immutable discount curve built from present value factors at node days.
+
+        Between the nodes the curve interpolates the log of the present value factors linearly
+        ('log_linear'), the continuous zero rates linearly ('linear_zero') or the log of the present value
+        factors with a monotone cubic ('monotone_cubic'). The present value factor at day 0 is 1, beyond the
+        last node the zero rate stays flat. A curve never changes once built, equal curves have equal hashes,
+        so it can be shared between pricers, cached and sent to worker processes.
+
+        ...
+
+        Attributes
+        ----------
+        days : 1d array
+            node days, increasing
+        log_pv : 1d array
+            log of the present value factors at the nodes
+        interpolation : string
+            'log_linear' (default), 'linear_zero' or 'monotone_cubic'
+        ntd : int
+            number of total days in a year (default 360)
+
+        Methods
+        -------
+        bootstrap(deposits=None, fras=None, swaps=None, period=360, interpolation='log_linear', ntd=360):
+            builds the curve repricing deposits, FRAs and par swaps
+        pv(days):
+            present value factors at days
+        zero(days):
+            continuous zero rates in percentage at days
+        libor(days):
+            simple (Libor) rates in percentage from 0 to days
+        fra(h, m):
+            FRA rates in percentage for m days starting in h days
+
+
+        """
+
+    __slots__ = ('days', 'log_pv', 'interpolation', 'ntd', '_slopes')
+
+    def __init__(self, days, pv, interpolation='log_linear', ntd=360):
+        if interpolation not in _INTERPOLATIONS:
+            raise ValueError('interpolation must be one of ' + ', '.join(_INTERPOLATIONS))
+        days, pv = np.asarray(days, dtype=float), np.asarray(pv, dtype=float)
+        if days.ndim != 1 or days.shape != pv.shape or len(days) == 0 or np.any(np.diff(days) <= 0) or days[0] <= 0:
+            raise ValueError('days must be positive and increasing with one present value factor per day')
+        log_pv = np.log(pv)
+        slopes = _monotone_slopes(np.append(0, days), np.append(0, log_pv)) if interpolation == 'monotone_cubic' \
+            else None
+        for name, value in zip(self.__slots__, (days, log_pv, interpolation, ntd, slopes)):
+            if isinstance(value, np.ndarray):
+                value.setflags(write=False)
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('YieldCurve is immutable')
+
+    def __reduce__(self):
+        return _yield_curve, (self.days, self.log_pv, self.interpolation, self.ntd)
+
+    def __eq__(self, other):
+        return isinstance(other, YieldCurve) and self.interpolation == other.interpolation and \
+            self.ntd == other.ntd and np.array_equal(self.days, other.days) and \
+            np.array_equal(self.log_pv, other.log_pv)
+
+    def __hash__(self):
+        return hash((self.days.tobytes(), self.log_pv.tobytes(), self.interpolation, self.ntd))
+
+    def __repr__(self):
+        return 'YieldCurve({} nodes up to {:g} days, {})'.format(len(self.days), self.days[-1], self.interpolation)
+
+    @classmethod
+    @instrumented
+    def bootstrap(cls, deposits=None, fras=None, swaps=None, period=360, interpolation='log_linear', ntd=360,
+                  tol=1e-14, max_iter=100):
+        """
+            Builds the curve with one node at the end of every instrument so that it reprices all of them.\n
+            Deposits are given as [[days, ...], [rates, ...]], FRAs as [[h, ...], [m, ...], [rates, ...]] and
+            par swaps as [[days, ...], [rates, ...]] with a payment every period days counted back from
+            the end. All rates are simple rates in percentage. The nodes are solved one after another, values
+            between the nodes come from the interpolated curve and the pass is repeated until no node changes
+            by more than tol.
+
+            Parameters:
+                deposits      : 2d list of deposit days and rates (optional)
+                fras          : 2d list of FRA expiry days, deposit days and rates (optional)
+                swaps         : 2d list of swap days and par rates (optional)
+                period        : days between two swap payments
+                interpolation : 'log_linear', 'linear_zero' or 'monotone_cubic'
+                ntd           : number of total days in a year
+            Returns:
+                :obj:`YieldCurve` - the bootstrapped curve
+        """
+        instruments = []
+        for d, r in zip(*(deposits or [[], []])):
+            instruments.append((float(d), 'deposit', float(r), None))
+        for h, m, r in zip(*(fras or [[], [], []])):
+            instruments.append((float(h + m), 'fra', float(r), float(h)))
+        for d, r in zip(*(swaps or [[], []])):
+            instruments.append((float(d), 'swap', float(r), np.arange(d, 0, -period)[::-1].astype(float)))
+        instruments.sort(key=lambda x: x[0])
+        days = np.array([x[0] for x in instruments])
+        if len(instruments) == 0 or np.any(np.diff(days) == 0):
+            raise ValueError('every instrument needs its own end day')
+        # start with the simple rates as if every instrument were a deposit
+        log_pv = -np.log1p(np.array([x[2] for x in instruments]) / 100 * days / ntd)
+        for _ in range(max_iter):
+            previous = log_pv.copy()
+            for i, (end, kind, rate, start) in enumerate(instruments):
+                curve = cls(days, np.exp(log_pv), interpolation, ntd)
+                if kind == 'deposit':
+                    log_pv[i] = -np.log1p(rate / 100 * end / ntd)
+                elif kind == 'fra':
+                    log_pv[i] = curve._log_pv(start) - np.log1p(rate / 100 * (end - start) / ntd)
+                else:
+                    # rate * sum(alpha_j * pv_j) = 1 - pv_n, the last payment solved for
+                    alpha = np.diff(np.append(0, start)) / ntd
+                    annuity = np.sum(alpha[:-1] * np.exp(curve._log_pv(start[:-1])))
+                    log_pv[i] = np.log((1 - rate / 100 * annuity) / (1 + rate / 100 * alpha[-1]))
+            if np.max(np.abs(log_pv - previous)) <= tol:
+                break
+        else:
+            logger.warning('bootstrap did not converge within %d passes', max_iter)
+        return cls(days, np.exp(log_pv), interpolation, ntd)
+
+    def pv(self, days):
+        return np.exp(self._log_pv(days))
+
+    def zero(self, days):
+        days = np.asarray(days, dtype=float)
+        return -self._log_pv(days) * self.ntd / days * 100
+
+    def libor(self, days):
+        days = np.asarray(days, dtype=float)
+        return (np.exp(-self._log_pv(days)) - 1) * self.ntd / days * 100
+
+    def fra(self, h, m):
+        h, m = np.asarray(h, dtype=float), np.asarray(m, dtype=float)
+        return (np.exp(self._log_pv(h) - self._log_pv(h + m)) - 1) * self.ntd / m * 100
+
+    def _log_pv(self, t):
+        t = np.asarray(t, dtype=float)
+        x, y = np.append(0, self.days), np.append(0, self.log_pv)
+        inside = np.clip(t, 0, x[-1])
+        if self.interpolation == 'log_linear':
+            res = np.interp(inside, x, y)
+        elif self.interpolation == 'linear_zero':
+            # zero rates per day, flat before the first node
+            z = self.log_pv / self.days
+            res = np.interp(inside, self.days, z) * inside
+        else:
+            res = _monotone_cubic(inside, x, y, self._slopes)
+        # flat zero rate beyond the last node
+        return np.where(t > x[-1], y[-1] / x[-1] * t, res)
+
+
+_INTERPOLATIONS = ('log_linear', 'linear_zero', 'monotone_cubic')
+
+
+def _yield_curve(days, log_pv, interpolation, ntd):
+    # rebuild a curve from the log of its present value factors without rounding them
+    curve = YieldCurve(days, np.ones(len(days)), interpolation, ntd)
+    log_pv = np.array(log_pv, dtype=float)
+    log_pv.setflags(write=False)
+    object.__setattr__(curve, 'log_pv', log_pv)
+    if interpolation == 'monotone_cubic':
+        object.__setattr__(curve, '_slopes', _monotone_slopes(np.append(0, curve.days), np.append(0, log_pv)))
+    return curve
+
+
+def _monotone_slopes(x, y):
+    # Fritsch-Carlson slopes keeping the cubic Hermite interpolant monotone between the nodes
+    h = np.diff(x)
+    delta = np.diff(y) / h
+    if len(delta) == 1:
+        return np.full(2, delta[0])
+    slopes = np.zeros(len(x))
+    w1, w2 = 2 * h[1:] + h[:-1], h[1:] + 2 * h[:-1]
+    same = delta[:-1] * delta[1:] > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slopes[1:-1] = np.where(same, (w1 + w2) / (w1 / delta[:-1] + w2 / delta[1:]), 0)
+    # shape preserving three point slopes at the ends
+    for end, (h0, h1, d0, d1) in ((0, (h[0], h[1], delta[0], delta[1])), (-1, (h[-1], h[-2], delta[-1], delta[-2]))):
+        m = ((2 * h0 + h1) * d0 - h0 * d1) / (h0 + h1)
+        if np.sign(m) != np.sign(d0):
+            m = 0
+        elif np.sign(d0) != np.sign(d1) and abs(m) > abs(3 * d0):
+            m = 3 * d0
+        slopes[end] = m
+    return slopes
+
+
+def _monotone_cubic(t, x, y, slopes):
+    # cubic Hermite interpolation with the given slopes at the nodes
+    k = np.clip(np.searchsorted(x, t, side='right') - 1, 0, len(x) - 2)
+    h = x[k + 1] - x[k]
+    s = (t - x[k]) / h
+    return (2 * s ** 3 - 3 * s ** 2 + 1) * y[k] + (s ** 3 - 2 * s ** 2 + s) * h * slopes[k] + \
+        (-2 * s ** 3 + 3 * s ** 2) * y[k + 1] + (s ** 3 - s ** 2) * h * slopes[k + 1]
 
 
 class EquityForward:
@@ -28,6 +364,7 @@ class EquityForward:
         theta  : 2d list of costs and days from initialization[[C1, C2, ... ], [t_C1, t_C2, ...]\n
         gamma_c: continuous benefits in percentage\n
         theta_c: continuous costs in percentage\n
+        curve  : shared :obj:`DiscountCurve` used for the discount factors (optional)\n
 
         Parameters:
              kwargs:
@@ -50,35 +387,195 @@ class EquityForward:
 
     def __init__(self, **kwargs):
         allowed_keys = {'s_0', 's_t', 't', 't_0_exp', 'r', 'r_c', 'gamma', 'theta', 'gamma_c', 'theta_c',
-                        'f_0', 'f_t', 'value_t'}
+                        'f_0', 'f_t', 'value_t', 'curve'}
         self.__dict__.update(dict(zip(allowed_keys, [None] * len(allowed_keys))))
         self.gamma, self.theta = [[0], [0]], [[0], [0]]
         self.gamma_c, self.theta_c = 0, 0
         self.__dict__.update((k, v) for k, v in kwargs.items() if k in allowed_keys)
 
+    @instrumented
     def f0(self):
 
         if self.r_c is not None:
-            self.f_0 = self.s_0 * np.exp((self.r_c + self.theta_c - self.gamma_c) / 100 * (self.t_0_exp / 360))
+            self.f_0 = self.s_0 * _factor(self.r_c + self.theta_c - self.gamma_c, self.t_0_exp,
+                                          convention='continuous', curve=self.curve)
 
         else:
-            gamma_0 = 0
-            for (gam, t) in zip(self.gamma[0], self.gamma[1]):
-                # print(gam)
-                # print(t)
-                gamma_0 = gamma_0 + gam / (1 + self.r / 100) ** (t / 360)
-            # print(gamma_0)
-
-            theta_0 = 0
-            for (thet, t) in zip(self.theta[0], self.theta[1]):
-                theta_0 = theta_0 + thet / (1 + self.r / 100) ** (t / 360)
-            self.f_0 = (self.s_0 + theta_0 - gamma_0) * (1 + self.r / 100) ** ((self.t_0_exp) / 360)
+            gamma_0 = np.sum(np.asarray(self.gamma[0], dtype=float) /
+                             _factor(self.r, np.asarray(self.gamma[1], dtype=float), curve=self.curve))
+            theta_0 = np.sum(np.asarray(self.theta[0], dtype=float) /
+                             _factor(self.r, np.asarray(self.theta[1], dtype=float), curve=self.curve))
+            self.f_0 = (self.s_0 + theta_0 - gamma_0) * _factor(self.r, self.t_0_exp, curve=self.curve)
+
+    @instrumented
+    def solve(self):
+        # fill the one missing input of f0 from the others, e.g. the implied dividend yield with gamma_c=None
+        schedules = [(np.asarray(v[0], dtype=float), np.asarray(v[1], dtype=float)) for v in (self.gamma, self.theta)]
+        if self.r_c is None and self.r is not None:
+            gamma_0, theta_0 = [np.sum(amount / _factor(self.r, days, curve=self.curve)) for amount, days in schedules]
+            _solve_attributes(self, 'equity_forward_discrete', gamma_0=gamma_0, theta_0=theta_0)
+        elif self.r_c is None and self.r is None and any(np.any(amount != 0) for amount, _ in schedules):
+            # the implied repo rate discounts the benefits and costs at the unknown rate itself
+            def residual(index, r):
+                gamma_0, theta_0 = [np.sum(amount / _factor(r[:, None], days, curve=self.curve), axis=1)
+                                    for amount, days in schedules]
+                return (self.s_0 + theta_0 - gamma_0) * _factor(r, self.t_0_exp, curve=self.curve) - self.f_0
+            r, converged = _find_root(residual, np.full(1, float(_RATE[0])), np.full(1, float(_RATE[1])))
+            if not converged.all():
+                logger.warning('equity_forward_discrete: r did not converge')
+            self.r = r[0]
+        else:
+            _solve_attributes(self, 'equity_forward')
 
+    @instrumented
     def value(self):
         # calculate f_t and value of contract if 't' is in the inputs
         if hasattr(self, 't') and hasattr(self, 's_t'):
-            self.f_t = self.s_t * (1 + self.r / 100) ** ((self.t_0_exp - self.t) / 360)
-            self.value_t = (self.f_t - self.f_0) / (1 + self.r / 100) ** ((self.t_0_exp - self.t) / 360)
+            compound = _factor(self.r, self.t_0_exp - self.t, curve=self.curve)
+            self.f_t = self.s_t * compound
+            self.value_t = (self.f_t - self.f_0) / compound
+
+    @classmethod
+    @instrumented
+    def from_arrays(cls, **kwargs):
+        """
+            Vectorized constructor for a whole book of equity forwards.\n
+            Accepts the keys s_0, f_0, r, r_c, t_0_exp, t, s_t, gamma_c and theta_c as scalars or 1d arrays,
+            which are broadcast against each other. Contracts with a NaN in r_c are priced with the discrete
+            rate r, all others continuously. f_0 is calculated for every contract with a spot price s_0 and
+            taken from the inputs otherwise. f_t and value_t are NaN where t or s_t is missing.\n
+            Discrete benefits and costs are passed as gamma and theta, each a :obj:`CarrySchedule` holding
+            the cash flows of all contracts of the book. A shared :obj:`DiscountCurve` is passed as curve.
+
+            Parameters:
+                 kwargs:
+            Returns:
+                :obj:`EquityForward` - equ:
+                    forward whose attributes f_0, f_t and value_t are :obj:`numpy.ndarray` with one entry
+                    per contract
+        """
+        allowed_keys = {'s_0', 's_t', 't', 't_0_exp', 'r', 'r_c', 'gamma_c', 'theta_c', 'f_0'}
+        inputs = dict(zip(allowed_keys, [np.nan] * len(allowed_keys)))
+        inputs.update(gamma_c=0, theta_c=0)
+        inputs.update((k, v) for k, v in kwargs.items() if k in allowed_keys and v is not None)
+        keys = list(inputs)
+        arrays = np.broadcast_arrays(*[np.atleast_1d(np.asarray(inputs[k], dtype=float)) for k in keys])
+        equ = cls(**dict(zip(keys, arrays)))
+        equ.gamma, equ.theta, equ.curve = kwargs.get('gamma'), kwargs.get('theta'), kwargs.get('curve')
+        gamma_0 = 0 if equ.gamma is None else equ.gamma.pv(equ.r, equ.curve)
+        theta_0 = 0 if equ.theta is None else equ.theta.pv(equ.r, equ.curve)
+        f_0 = _equity_f0(equ.s_0, equ.t_0_exp, equ.r, equ.r_c, equ.gamma_c, equ.theta_c, gamma_0, theta_0,
+                         equ.curve)
+        equ.f_0 = np.where(np.isnan(equ.s_0), equ.f_0, f_0)
+        equ.f_t, equ.value_t = _equity_value(equ.f_0, equ.s_t, equ.r, equ.t_0_exp, equ.t, equ.curve)
+        return equ
+
+    def scenario_values(self, spot_paths, t_grid, chunk_size=1024):
+        """
+            Marks the contract, or every contract of a book created with :meth:`from_arrays`, across
+            simulated spot paths and a grid of valuation days.\n
+            The cube is generated in chunks of at most chunk_size contracts, so only one chunk of shape
+            (chunk_size, number of paths, number of valuation days) is held in memory at a time.
+
+            Parameters:
+                spot_paths : 2d array of spot prices with one path per row and one column per valuation day
+                t_grid     : 1d array of days from initialization to valuation
+                chunk_size : maximum number of contracts per chunk
+            Returns:
+                generator of (start, stop, value_t) - value_t of the contracts start to stop - 1 with shape
+                (stop - start, number of paths, number of valuation days)
+        """
+        spot_paths = np.atleast_2d(np.asarray(spot_paths, dtype=float))
+        t_grid = np.atleast_1d(np.asarray(t_grid, dtype=float))
+        if spot_paths.shape[1] != len(t_grid):
+            raise ValueError('spot_paths must have one column per valuation day in t_grid')
+        f_0, r, t_0_exp = np.broadcast_arrays(*[np.atleast_1d(np.asarray(x, dtype=float))
+                                                for x in (self.f_0, self.r, self.t_0_exp)])
+        for start in range(0, len(f_0), chunk_size):
+            stop = min(start + chunk_size, len(f_0))
+            # value_t = (f_t - f_0) / compound = s_t - f_0 / compound
+            compound = _factor(r[start:stop, None], t_0_exp[start:stop, None] - t_grid, curve=self.curve)
+            yield start, stop, spot_paths - (f_0[start:stop, None] / compound)[:, None, :]
+
+    @classmethod
+    def from_frame(cls, df):
+        """
+            Vectorized constructor from a :obj:`pandas.DataFrame` with one contract per row and the
+            columns accepted by :meth:`from_arrays`. Unknown columns are ignored.
+        """
+        return cls.from_arrays(**{col: df[col].to_numpy() for col in df.columns})
+
+
+class CarrySchedule:
+    """
+        A class to represent the discrete carry cash flows (benefits or costs) of a whole book of forwards.
+
+        The cash flows of all contracts are stored in contiguous arrays, the ones of contract i are
+        amounts[offsets[i]:offsets[i + 1]] paid days[offsets[i]:offsets[i + 1]] days from initialization.
+
+        ...
+
+        Attributes
+        ----------
+        offsets : numpy.ndarray
+            start of the cash flows of every contract, with the total number of cash flows appended
+        amounts : numpy.ndarray
+            cash flow amounts, e.g. dividends D1, D2, ...
+        days : numpy.ndarray
+            days from initialization to the payment of the cash flows
+        contract : numpy.ndarray
+            index of the contract each cash flow belongs to
+
+        Methods
+        -------
+        from_lists(schedules):
+            creates the schedule from one 2d list [[D1, D2, ...], [t_D1, t_D2, ...]] per contract
+        pv(r, curve=None):
+            present value of the cash flows of every contract at the risk-free rate r in percentage
+
+
+        """
+
+    def __init__(self, offsets, amounts, days):
+        self.offsets = np.ascontiguousarray(offsets, dtype=np.int64)
+        self.amounts = np.ascontiguousarray(amounts, dtype=float)
+        self.days = np.ascontiguousarray(days, dtype=float)
+        if self.offsets.ndim != 1 or len(self.offsets) == 0 or self.offsets[0] != 0 or \
+                self.offsets[-1] != len(self.amounts) or np.any(np.diff(self.offsets) < 0):
+            raise ValueError('offsets must rise from 0 to the number of cash flows')
+        if self.days.shape != self.amounts.shape:
+            raise ValueError('amounts and days must have the same length')
+        self.contract = np.repeat(np.arange(len(self)), np.diff(self.offsets))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @classmethod
+    def from_lists(cls, schedules):
+        lengths = [len(schedule[0]) for schedule in schedules]
+        offsets = np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)))
+        amounts = np.concatenate([np.asarray(schedule[0], dtype=float) for schedule in schedules] + [[]])
+        days = np.concatenate([np.asarray(schedule[1], dtype=float) for schedule in schedules] + [[]])
+        return cls(offsets, amounts, days)
+
+    def pv(self, r, curve=None):
+        r = np.broadcast_to(np.asarray(r, dtype=float), (len(self),))
+        discounted = self.amounts / _factor(r[self.contract], self.days, curve=curve)
+        return np.bincount(self.contract, weights=discounted, minlength=len(self))
+
+
+def _equity_f0(s_0, t_0_exp, r, r_c, gamma_c, theta_c, gamma_0=0, theta_0=0, curve=None):
+    # vectorized EquityForward.f0, continuous compounding wherever r_c is given
+    f_discrete = (s_0 + theta_0 - gamma_0) * _factor(r, t_0_exp, curve=curve)
+    f_continuous = s_0 * _factor(r_c + theta_c - gamma_c, t_0_exp, convention='continuous', curve=curve)
+    return np.where(np.isnan(r_c), f_discrete, f_continuous)
+
+
+def _equity_value(f_0, s_t, r, t_0_exp, t, curve=None):
+    # vectorized EquityForward.value, returns f_t and value_t
+    compound = _factor(r, t_0_exp - t, curve=curve)
+    f_t = s_t * compound
+    return f_t, (f_t - f_0) / compound
 
 
 class FRA:
@@ -117,6 +614,8 @@ class FRA:
             value of FRA at g days after initiation
         NTD : int
             number of total days in a year, used for interest calculations (always 360 in the Libor market)
+        curve : DiscountCurve
+            shared discount factor service (optional)
 
         Methods
         -------
@@ -127,34 +626,135 @@ class FRA:
                 :keyword NA:
                 :keyword m:
                 :keyword L_h:
+        strip(days, libor=None, pv=None, h=None, m=None):
+            calculates the grid of h x m FRA rates implied by one spot curve
+        revalue_book(NA, FRA_0, h, m, g, days, libor):
+            calculates value_g of a book of FRAs for a history of curves
 
 
         """
 
     def __init__(self, **kwargs):
         allowed_keys = {'NA', 'h', 'm', 'L_h', 'FRA_0', 'FRA_g', 'value_g', 'interest',
-                        'pay_set', 'D_h', 'g', 'L_0', 'L_g', 'NTD'}
+                        'pay_set', 'D_h', 'g', 'L_0', 'L_g', 'NTD', 'curve'}
         self.__dict__.update(dict(zip(allowed_keys, [None] * len(allowed_keys))))
         self.NTD = 360
         self.__dict__.update((k, v) for k, v in kwargs.items() if k in allowed_keys)
 
+    @instrumented
     def fra(self, libor):
         if libor[0][0] == 0:
             self.L_0 = libor
             if self.L_0 is not None:
-                self.FRA_0 = ((1 + self.L_0[1][1] / 100 * (
-                            (self.L_0[0][1] + self.L_0[0][2] - self.L_0[0][0]) / self.NTD)) /
-                              (1 + self.L_0[1][0] / 100 * ((self.L_0[0][1] - self.L_0[0][0]) / self.NTD)) - 1) / \
+                self.FRA_0 = (self._simple(self.L_0[1][1], self.L_0[0][1] + self.L_0[0][2] - self.L_0[0][0]) /
+                              self._simple(self.L_0[1][0], self.L_0[0][1] - self.L_0[0][0]) - 1) / \
                              (self.L_0[0][2] / self.NTD) * 100
         else:
             self.L_g = libor
             self.g = self.L_g[0][0]
             if self.L_g is not None:
-                self.FRA_g = ((1 + self.L_g[1][1] / 100 * (
-                            (self.L_g[0][1] + self.L_g[0][2] - self.L_g[0][0]) / self.NTD)) /
-                              (1 + self.L_g[1][0] / 100 * ((self.L_g[0][1] - self.L_g[0][0]) / self.NTD)) - 1) / \
+                self.FRA_g = (self._simple(self.L_g[1][1], self.L_g[0][1] + self.L_g[0][2] - self.L_g[0][0]) /
+                              self._simple(self.L_g[1][0], self.L_g[0][1] - self.L_g[0][0]) - 1) / \
                              (self.L_g[0][2] / self.NTD) * 100
 
+    @classmethod
+    @instrumented
+    def strip(cls, days, libor=None, pv=None, h=None, m=None, ntd=360, curve=None):
+        """
+            Calculates every h x m FRA rate implied by one spot curve in one vectorized pass, e.g. the
+            strip 1x4 through 12x15 with the defaults h = 30, 60, ..., 360 and m = 90 days.\n
+            The curve is given as Libor in percentage or as present value factors at the tenors days and
+            is interpolated linearly in Libor between the tenors, or as a :obj:`YieldCurve` in pv.
+
+            Parameters:
+                days   : 1d array of tenors of the spot curve in days, not used with a YieldCurve
+                libor  : 1d array of Libor rates in percentage at days
+                pv     : 1d array of present value factors at days or a :obj:`YieldCurve`, used if libor is
+                         not given
+                h      : 1d array of days until the FRAs expire
+                m      : 1d array of days to maturity of the underlying deposits
+                ntd    : number of total days in a year
+                curve  : shared :obj:`DiscountCurve` (optional)
+            Returns:
+                :obj:`pandas.DataFrame` - FRA rates in percentage with index h and columns m
+        """
+        h = np.arange(30, 361, 30) if h is None else np.atleast_1d(h)
+        m = np.array([90]) if m is None else np.atleast_1d(m)
+        near, far = np.asarray(h, dtype=float)[:, None], np.asarray(h, dtype=float)[:, None] + m
+        if isinstance(pv, YieldCurve):
+            l_near, l_far = _curve_libor([pv], near), _curve_libor([pv], far)
+        else:
+            days = np.asarray(days, dtype=float)
+            if libor is None:
+                libor = (1 / np.asarray(pv, dtype=float) - 1) * ntd / days * 100
+            l_near, l_far = np.interp(near, days, libor), np.interp(far, days, libor)
+        rates = (_factor(l_far, far, ntd, 'simple', curve) / _factor(l_near, near, ntd, 'simple', curve) - 1) / \
+            (m / ntd) * 100
+        return pd.DataFrame(rates, index=pd.Index(h, name='h'), columns=pd.Index(m, name='m'))
+
+    @classmethod
+    @instrumented
+    def risk(cls, curve, NA, FRA_0, h, m, bp=1):
+        """
+            Bucketed DV01 of a book of FRAs, the change in value of every FRA when the zero rate of one node of
+            the curve rises by bp basis points, for all nodes in one batch.\n
+            A FRA paying FRA_0 on NA for m days in h days is worth NA * (pv_h - pv_h+m * (1 + FRA_0 * m / ntd)).
+
+            Parameters:
+                curve : :obj:`YieldCurve`
+                NA    : 1d array of notional amounts
+                FRA_0 : 1d array of FRA rates in percentage
+                h     : 1d array of days until the FRAs expire
+                m     : 1d array of days to maturity of the underlying deposits
+                bp    : size of the bumps in basis points
+            Returns:
+                :obj:`pandas.DataFrame` - value changes with one row per FRA and one column per node
+        """
+        NA, FRA_0, h, m = [np.asarray(v, dtype=float) for v in np.broadcast_arrays(NA, FRA_0, h, m)]
+        pv = _bucket_pv(curve, np.concatenate((h, h + m)), bp)
+        pv_h, pv_far = pv[:, :len(h)], pv[:, len(h):]
+        values = NA * (pv_h - pv_far * (1 + FRA_0 / 100 * m / curve.ntd))
+        return _bucket_risk(values, curve.days)
+
+    @classmethod
+    @instrumented
+    def revalue_book(cls, NA, FRA_0, h, m, g, days, libor, ntd=360, curve=None):
+        """
+            Calculates value_g of every FRA of a book on every valuation day in one vectorized pass.\n
+            On valuation day g the FRA rate FRA_g is implied by the Libor for h - g and h + m - g days,
+            and the payment is discounted with the Libor for h + m - g days (D_h), all interpolated linearly
+            between the tenors of the curve of that day or taken from the :obj:`YieldCurve` of that day.
+            FRAs expired on a valuation day (g > h) are NaN.
+
+            Parameters:
+                NA     : 1d array of notional amounts
+                FRA_0  : 1d array of initial FRA rates in percentage
+                h      : 1d array of days from initiation until the FRAs expire
+                m      : 1d array of days to maturity of the underlying deposits
+                g      : 1d array of valuation days from initiation
+                days   : 1d array of tenors of the curves in days, not used with YieldCurves
+                libor  : 2d array of Libor in percentage with one curve per valuation day and one column per tenor,
+                         or a sequence of :obj:`YieldCurve` with one curve per valuation day
+                ntd    : number of total days in a year
+                curve  : shared :obj:`DiscountCurve` (optional)
+            Returns:
+                :obj:`numpy.ndarray` - value_g with one row per FRA and one column per valuation day
+        """
+        NA, FRA_0, h, m = [np.asarray(v, dtype=float)[:, None] for v in np.broadcast_arrays(NA, FRA_0, h, m)]
+        g = np.atleast_1d(np.asarray(g, dtype=float))
+        near = h - g
+        far = near + m
+        if len(libor) and isinstance(libor[0], YieldCurve):
+            l_near, l_far = _curve_libor(libor, near), _curve_libor(libor, far)
+        else:
+            l_near = _interp_curves(near, days, libor)
+            l_far = _interp_curves(far, days, libor)
+        discount = _factor(l_far, far, ntd, 'simple', curve)
+        fra_g = (discount / _factor(l_near, near, ntd, 'simple', curve) - 1) / (m / ntd) * 100
+        value_g = NA * ((fra_g - FRA_0) / 100 * m / ntd) / discount
+        return np.where(near >= 0, value_g, np.nan)
+
+    @instrumented
     def calc_interest(self, **kwargs):
         allowed_keys = {'NA', 'm', 'L_h'}
         self.__dict__.update((k, v) for k, v in kwargs.items() if k in allowed_keys)
@@ -163,19 +763,21 @@ class FRA:
         else:
             raise ValueError('NA, m or L_H is not defined')
 
+    @instrumented
     def payment(self, **kwargs):
         allowed_keys = {'NA', 'FRA_0', 'm', 'L_h', 'D_h'}
         self.__dict__.update((k, v) for k, v in kwargs.items() if k in allowed_keys)
         if self.NA is not None and self.L_h is not None and \
                 self.m is not None and self.FRA_0 is not None and self.D_h is not None:
-            self.pay_set = self.NA * ((self.FRA_0 - self.L_h) / 100 * self.m / self.NTD) / (
-                    1 + (self.D_h / 100) * self.m / self.NTD)
+            self.pay_set = self.NA * ((self.FRA_0 - self.L_h) / 100 * self.m / self.NTD) / \
+                self._simple(self.D_h, self.m)
 
+    @instrumented
     def value(self, **kwargs):
         allowed_keys = {'NA', 'FRA_0', 'FRA_g', 'm', 'L_h', 'D_h', 'g', 'h', 'L_0', 'L_g'}
         self.__dict__.update((k, v) for k, v in kwargs.items() if k in allowed_keys)
         if 'L_0' in kwargs:
-            print(self.L_0)
+            logger.debug('L_0: %s', self.L_0)
             self.fra(self.L_0)
         if 'L_g' in kwargs:
             self.fra(self.L_g)
@@ -183,8 +785,31 @@ class FRA:
         if self.NA is not None and self.FRA_0 is not None and \
                 self.h is not None and self.m is not None and self.g is not None \
                 and self.FRA_g is not None and self.D_h is not None:
-            self.value_g = self.NA * ((self.FRA_g - self.FRA_0) / 100 * self.m / self.NTD) / (
-                    1 + (self.D_h / 100) * (self.h + self.m - self.g) / self.NTD)
+            self.value_g = self.NA * ((self.FRA_g - self.FRA_0) / 100 * self.m / self.NTD) / \
+                self._simple(self.D_h, self.h + self.m - self.g)
+
+    def _simple(self, libor, days):
+        # simple interest accumulation factor 1 + libor / 100 * days / NTD
+        return _factor(libor, days, self.NTD, 'simple', self.curve)
+
+
+def _curve_libor(curves, t):
+    # column j of t is looked up on YieldCurve j or on the only curve, the Libor of 0 days or less is 0
+    curves = list(curves) * t.shape[1] if len(curves) == 1 else curves
+    with np.errstate(divide='ignore', invalid='ignore'):
+        libor = np.column_stack([curve.libor(t[:, j]) for j, curve in enumerate(curves)])
+    return np.where(t > 0, libor, 0)
+
+
+def _interp_curves(t, days, curves):
+    # linear interpolation in the tenors days, column j of t is looked up on curve j, flat beyond the ends
+    days = np.asarray(days, dtype=float)
+    curves = np.atleast_2d(np.asarray(curves, dtype=float))
+    t = np.clip(t, days[0], days[-1])
+    right = np.clip(np.searchsorted(days, t), 1, len(days) - 1)
+    weight = (t - days[right - 1]) / (days[right] - days[right - 1])
+    column = np.arange(curves.shape[0])
+    return curves[column, right - 1] * (1 - weight) + curves[column, right] * weight
 
 
 class FixedIncomeForward:
@@ -221,32 +846,201 @@ class FixedIncomeForward:
             future value of coupons
         PVCI : float
             present value of coupons
+        curve : DiscountCurve
+            shared discount factor service (optional)
+
+        Methods
+        -------
+        carry(**kwargs):
+            calculates AI_0, AI_T, FVCI and PVCI from NAD, NTD, n, C, r and T. Bond inputs may be arrays of
+            bonds and T, r arrays of tenors, the results are then bonds x tenors and feed straight into f0
+        f0(**kwargs):
+            calculates F_0 and QF_0
+        solve(**kwargs):
+            calculates the one missing input of f0, e.g. the implied repo rate r from QF_0 and CF
+        value(**kwargs):
+            calculates V_t
 
 
     """
 
     def __init__(self, **kwargs):
-        allowed_keys = {'NAD', 'NTD', 'n', 'C', 'F_0', 'F_t' 'B_0', 'S_0', 'QF_0',
+        allowed_keys = {'NAD', 'NTD', 'n', 'C', 'F_0', 'F_t', 'B_0', 'S_0', 'QF_0',
                         'CF', 'AI_0', 'AI_T', 'FVCI', 'PVCI', 'r', 'T', 'contract_value',
-                        'n_contracts', 'par', 'V_t'}
+                        'n_contracts', 'par', 'V_t', 'curve'}
         self.__dict__.update(dict(zip(allowed_keys, [None] * len(allowed_keys))))
         self.__dict__.update((k, v) for k, v in kwargs.items() if k in allowed_keys)
 
+    @instrumented
+    def carry(self, **kwargs):
+        allowed_keys = {'NAD', 'NTD', 'n', 'C', 'r', 'T'}
+        self.__dict__.update((k, v) for k, v in kwargs.items() if k in allowed_keys)
+        NAD, NTD, C = np.broadcast_arrays(*[np.asarray(v, dtype=float) for v in (self.NAD, self.NTD, self.C)])
+        T, r = np.broadcast_arrays(np.asarray(self.T, dtype=float), np.asarray(self.r, dtype=float))
+        if NAD.ndim and T.ndim:
+            NAD, NTD, C = NAD[:, None], NTD[:, None], C[:, None]
+        # years until the next coupon
+        t_next = (NTD - NAD) / NTD / self.n
+        self.AI_0, self.AI_T, self.FVCI, self.PVCI = _coupon_carry(C, t_next, self.n, T, r, self.curve)
+        if T.ndim:
+            self.T, self.r = T, r
+        if NAD.ndim and T.ndim:
+            self.AI_0 = self.AI_0[:, :1]
+
+    @instrumented
     def f0(self, **kwargs):
         allowed_keys = {'B_0', 'AI_0', 'AI_T', 'FVCI', 'CF', 'r', 'T'}
         self.__dict__.update((k, v) for k, v in kwargs.items() if k in allowed_keys)
         if self.B_0 is not None and self.AI_0 is not None and \
                 self.AI_T is not None and self.FVCI is not None and self.CF is not None:
-            self.F_0 = (1 + self.r / 100) ** self.T * (self.B_0 + self.AI_0) - self.AI_T - self.FVCI
+            B_0, CF = self.B_0, self.CF
+            if np.ndim(self.AI_T) == 2:
+                # bonds x tenors from carry()
+                B_0, CF = [np.reshape(v, (-1, 1)) if np.ndim(v) == 1 else v for v in (B_0, CF)]
+            self.F_0 = _factor(self.r, self.T, 1, curve=self.curve) * (B_0 + self.AI_0) - self.AI_T - self.FVCI
             if self.CF is not None:
-                self.QF_0 = 1 / self.CF * self.F_0
+                self.QF_0 = 1 / CF * self.F_0
+
+    @classmethod
+    @instrumented
+    def risk(cls, curve, B_0, AI_0, AI_T, FVCI, F_0, T, bp=1):
+        """
+            Bucketed DV01 of a book of long fixed income forwards bought at F_0 with T years to delivery, the
+            change in value B_0 + AI_0 - (F_0 + AI_T + FVCI) * pv_T when the zero rate of one node of the
+            curve rises by bp basis points, for all nodes in one batch.
 
+            Returns:
+                :obj:`pandas.DataFrame` - value changes with one row per forward and one column per node
+        """
+        return _fixed_income_risk(curve, B_0, AI_0, AI_T, FVCI, F_0, T, bp)
+
+    @instrumented
+    def solve(self, **kwargs):
+        # fill the one missing input of f0 from the others, e.g. the implied repo rate r from QF_0 and CF
+        allowed_keys = {'B_0', 'AI_0', 'AI_T', 'FVCI', 'CF', 'r', 'T', 'F_0', 'QF_0'}
+        self.__dict__.update((k, v) for k, v in kwargs.items() if k in allowed_keys)
+        if self.F_0 is None and self.QF_0 is not None and self.CF is not None:
+            self.F_0 = self.QF_0 * self.CF
+        _solve_attributes(self, 'fixed_income_forward')
+        if self.CF is not None:
+            self.QF_0 = self.F_0 / self.CF
+
+    @instrumented
     def value(self, **kwargs):
         allowed_keys = {'F_0', 'F_t', 'r', 'T'}
         self.__dict__.update((k, v) for k, v in kwargs.items() if k in allowed_keys)
         if self.F_0 is not None and self.F_t is not None and \
                 self.r is not None and self.T:
-            self.V_t = (1 + self.r / 100) ** self.T * (self.F_t - self.F_0)
+            self.V_t = _factor(self.r, self.T, 1, curve=self.curve) * (self.F_t - self.F_0)
+
+
+def _fixed_income_risk(curve, B_0, AI_0, AI_T, FVCI, F_0, T, bp=1):
+    # a long forward bought at F_0 is worth B_0 + AI_0 - (F_0 + AI_T + FVCI) * pv_T, T in years
+    B_0, AI_0, AI_T, FVCI, F_0, T = [np.asarray(v, dtype=float) for v in
+                                     np.broadcast_arrays(B_0, AI_0, AI_T, FVCI, F_0, T)]
+    return _bucket_risk(B_0 + AI_0 - (F_0 + AI_T + FVCI) * _bucket_pv(curve, T * curve.ntd, bp), curve.days)
+
+
+class DeliverableBasket:
+    """
+        A class to represent the basket of bonds deliverable into a strip of bond futures contract months
+        and to find the cheapest-to-deliver (CTD) bond of every contract month.
+
+        Bonds are along the first, contract months along the second axis of all results. For every pair
+        the forward price F_0 of the bond follows :meth:`FixedIncomeForward.f0`, with accrued interest and
+        coupons during the life of the contract calculated from the coupon schedules. The CTD bond has
+        the lowest net basis, the cost of buying the bond, carrying it to delivery and delivering it.
+
+        ...
+
+        Attributes
+        ----------
+        B_0 : 1d array
+            quoted (clean) prices of the bonds per 100 par
+        C : 1d array
+            stated annual coupons per 100 par
+        maturity : 1d array
+            years until the bonds mature
+        n : int
+            number of coupon payments per year (default 2)
+        CF : 1d or 2d array
+            conversion factors of the bonds, per bond or per bond and contract month
+        QF_0 : 1d array
+            quoted futures prices of the contract months
+        T : 1d array
+            years until delivery of the contract months
+        r : float or 1d array
+            repo (risk-free) rate in percentage per contract month
+        AI_0 : 1d array
+            accrued interest of the bonds at 0
+        AI_T : 2d array
+            accrued interest at delivery
+        FVCI : 2d array
+            future value at delivery of the coupons paid until delivery
+        F_0 : 2d array
+            forward price of the bonds
+        implied_repo : 2d array
+            repo rate in percentage earned by buying the bond and delivering it into the contract
+        gross_basis : 2d array
+            B_0 - QF_0 * CF
+        net_basis : 2d array
+            F_0 - QF_0 * CF, the gross basis net of carry, F_0 is clean of AI_T
+        ctd : 1d array
+            index of the cheapest-to-deliver bond per contract month
+
+        Methods
+        -------
+        calc():
+            calculates all results for the whole basket and strip
+
+
+        """
+
+    def __init__(self, **kwargs):
+        allowed_keys = {'B_0', 'C', 'maturity', 'n', 'CF', 'QF_0', 'T', 'r', 'AI_0', 'AI_T', 'FVCI', 'F_0',
+                        'implied_repo', 'gross_basis', 'net_basis', 'ctd', 'curve'}
+        self.__dict__.update(dict(zip(allowed_keys, [None] * len(allowed_keys))))
+        self.n = 2
+        self.__dict__.update((k, v) for k, v in kwargs.items() if k in allowed_keys)
+
+    @instrumented
+    def calc(self):
+        B_0, C, maturity = [np.asarray(v, dtype=float)[:, None] for v in
+                            np.broadcast_arrays(self.B_0, self.C, self.maturity)]
+        QF_0, T, r = np.broadcast_arrays(*[np.atleast_1d(np.asarray(v, dtype=float)) for v in
+                                           (self.QF_0, self.T, self.r)])
+        CF = np.asarray(self.CF, dtype=float)
+        CF = CF[:, None] if CF.ndim == 1 else CF
+        # first coupon after 0, coupons of C / n are paid every 1 / n years back from maturity
+        t_next = maturity - (np.ceil(np.round(maturity * self.n, 10)) - 1) / self.n
+        ai_0, self.AI_T, self.FVCI, _ = _coupon_carry(C, t_next, self.n, T, r, self.curve, maturity)
+        self.AI_0 = ai_0[:, 0]
+        invoice = QF_0 * CF + self.AI_T
+        self.F_0 = _factor(r, T, 1, curve=self.curve) * (B_0 + ai_0) - self.AI_T - self.FVCI
+        self.implied_repo = (((invoice + self.FVCI) / (B_0 + ai_0)) ** (1 / T) - 1) * 100
+        self.gross_basis = B_0 - QF_0 * CF
+        self.net_basis = self.F_0 - QF_0 * CF
+        self.ctd = np.argmin(self.net_basis, axis=0)
+
+
+def _coupon_carry(C, t_next, n, T, r, curve=None, maturity=np.inf):
+    # accrued interest at 0 and T and future and present value at T resp. 0 of the coupons paid in (0, T],
+    # coupons of C / n are paid every 1 / n years from t_next (in years) on until maturity
+    C, t_next, T, r, maturity = np.broadcast_arrays(*[np.asarray(v, dtype=float) for v in
+                                                      (C, t_next, T, r, maturity)])
+    coupon = C / n
+    # number of coupons paid until T
+    paid = np.where(T >= t_next, np.floor(np.round((np.minimum(T, maturity) - t_next) * n, 10)) + 1, 0)
+    ai_0 = coupon * (1 - t_next * n)
+    ai_t = coupon * ((T - (t_next + (paid - 1) / n)) * n)
+    # geometric sums of the coupons compounded to T and discounted to 0
+    growth = _factor(r, 1 / n, 1, curve=curve)
+    last = t_next + (paid - 1) / n
+    with np.errstate(invalid='ignore', divide='ignore'):
+        series = np.where(growth == 1, paid, (growth ** paid - 1) / (growth - 1))
+    fvci = np.where(paid > 0, coupon * _factor(r, T - last, 1, curve=curve) * series, 0)
+    pvci = fvci / _factor(r, T, 1, curve=curve)
+    return ai_0, ai_t, fvci, pvci
 
 
 class CurrencyContracts:
@@ -265,78 +1059,236 @@ class CurrencyContracts:
             denotes the number of coupon payments per year
         T : float
             the stated annual coupon amount
+        market : CurrencyGraph
+            shared currency market (optional)
 
+        Methods
+        -------
+        calc(**kwargs):
+            calculates the missing value of F_0, F_t and V_t relations, inputs may be scalars or arrays
+        notional(currency, market=None):
+            the notional amount NA in FC converted to currency
+        grid(S_t, r_d_t, r_f_t, T_t, F_0=None, NA=1, pip=10000, curr_pair=None, curve=None, market=None):
+            outrights, forward points and values of N currency pairs x M tenors
 
 
     """
 
     def __init__(self, **kwargs):
         allowed_keys = {'curr_pair', 'S_0', 'F_0', 'r_d', 'r_f', 'T_0', 'NA', 'F_t', 'V_t',
-                        'S_t', 'r_d_t', 'r_f_t', 'T_t'}
+                        'S_t', 'r_d_t', 'r_f_t', 'T_t', 'points', 'market'}
         self.__dict__.update(dict(zip(allowed_keys, [None] * len(allowed_keys))))
         self.__dict__.update((k, v) for k, v in kwargs.items() if k in allowed_keys)
 
+    @instrumented
     def calc(self, **kwargs):
         allowed_keys = {'curr_pair', 'S_0', 'F_0', 'r_d', 'r_f', 'T_0', 'NA', 'F_t', 'V_t',
                         'S_t', 'r_d_t', 'r_f_t', 'T_t'}
         self.__dict__.update((k, v) for k, v in kwargs.items() if k in allowed_keys)
-        # calc missing value in F_0
-        my_sym = {}
-        known_var = {}
-        # create symbolic variables for the equation
-        f_0_keys = {'S_0', 'F_0', 'r_d', 'r_f', 'T_0'}
-        for var_sym in f_0_keys:
-            my_sym[var_sym] = sym.symbols(var_sym)
-        for attribute, value in self.__dict__.items():
-            if value is None and attribute in f_0_keys:
-                unkown_x = attribute
-            elif attribute in f_0_keys:
-                known_var[my_sym[attribute]] = value
-        exp = sym.Eq(-my_sym['F_0'] + (my_sym['S_0'] *
-                                       (1 + my_sym['r_f'] / 100) ** my_sym['T_0'] /
-                                       (1 + my_sym['r_d'] / 100) ** my_sym['T_0']), 0)
-        exp = exp.subs(known_var)
-        res = sym.solveset(exp, my_sym[unkown_x])
-        setattr(self, unkown_x, res.args[0])
-        del exp, res, f_0_keys
-        # calc missing value in F_t
-        my_sym = {}
-        known_var = {}
-        # create symbolic variables for the equation
-        f_t_keys = {'S_t', 'F_t', 'r_d_t', 'r_f_t', 'T_t'}
-        for var_sym in f_t_keys:
-            my_sym[var_sym] = sym.symbols(var_sym)
-        for attribute, value in self.__dict__.items():
-            if value is None and attribute in f_t_keys:
-                unkown_x = attribute
-            elif attribute in f_t_keys:
-                known_var[my_sym[attribute]] = value
-        exp = sym.Eq(-my_sym['F_t'] + (my_sym['S_t'] *
-                                       (1 + my_sym['r_f_t'] / 100) ** my_sym['T_t'] /
-                                       (1 + my_sym['r_d_t'] / 100) ** my_sym['T_t']), 0)
-        exp = exp.subs(known_var)
-        res = sym.solveset(exp, my_sym[unkown_x])
-        setattr(self, unkown_x, res.args[0])
-        del exp, res, f_t_keys
-
-        # calc missing value in V_t
-        my_sym = {}
-        known_var = {}
-        # create symbolic variables for the equation
-        v_t_keys = {'F_0', 'F_t', 'r_f_t', 'T_t', 'V_t'}
-        for var_sym in v_t_keys:
-            my_sym[var_sym] = sym.symbols(var_sym)
-        for attribute, value in self.__dict__.items():
-            if value is None and attribute in v_t_keys:
-                unkown_x = attribute
-            elif attribute in v_t_keys:
-                known_var[my_sym[attribute]] = value
-        exp = sym.Eq(-my_sym['V_t'] + (my_sym['F_0'] - my_sym['F_t']) *
-                     (1 + my_sym['r_f_t'] / 100) ** my_sym['T_t'], 0)
-        exp = exp.subs(known_var)
-        res = sym.solveset(exp, my_sym[unkown_x])
-        setattr(self, unkown_x, res.args[0])
-        del exp, res, v_t_keys
+        # solve every relation with exactly one missing value until nothing is left to solve,
+        # a value solved in one relation may complete the next one
+        solved = True
+        while solved:
+            solved = False
+            for relation, (keys, _) in enumerate(_CIP_RELATIONS):
+                missing = [k for k in keys if getattr(self, k) is None]
+                if len(missing) == 1:
+                    known = [getattr(self, k) for k in keys if k != missing[0]]
+                    setattr(self, missing[0], _cip_solver(relation, missing[0])(*known))
+                    solved = True
+
+    def notional(self, currency, market=None):
+        market = self.market if market is None else market
+        return market.convert(self.NA, self.curr_pair.split('/')[1], currency)
+
+    @classmethod
+    @instrumented
+    def grid(cls, S_t, r_d_t, r_f_t, T_t, F_0=None, NA=1, pip=10000, curr_pair=None, curve=None, market=None):
+        """
+            Revalues a whole FX forward book of N currency pairs and M tenors in one vectorized pass.\n
+            Spot rates are broadcast along the pairs, the domestic and foreign rates in percentage are
+            curves over the M tenors, either shared by all pairs (1d) or one row per pair (N x M). The
+            outright F_t follows covered interest rate parity, the forward points are F_t - S_t in pips.
+            Existing forwards with contract rates F_0 and notional NA are marked to market by discounting
+            F_0 - F_t over T_t at the foreign rate; a fresh forward is priced at t = 0 with T_t its tenor.
+
+            Parameters:
+                S_t       : 1d array of spot rates DC/FC of the N pairs
+                r_d_t     : domestic rates in percentage, 1d over the tenors or N x M
+                r_f_t     : foreign rates in percentage, 1d over the tenors or N x M
+                T_t       : 1d array of the M years to delivery
+                F_0       : contract rates of existing forwards, broadcast to N x M (optional)
+                NA        : notional amounts in FC, broadcast to N x M
+                pip       : pips per unit of the quote, e.g. 100 for JPY pairs, broadcast along the pairs
+                curr_pair : 1d array of the N currency pairs DC/FC (optional)
+                curve     : shared :obj:`DiscountCurve` (optional)
+                market    : :obj:`CurrencyGraph` the spot rates of curr_pair are taken from if S_t is None
+            Returns:
+                :obj:`CurrencyContracts` - cc:
+                    contracts whose attributes F_t, points and V_t are N x M :obj:`numpy.ndarray`
+        """
+        if S_t is None:
+            S_t = market.rates(curr_pair)
+        S_t = np.atleast_1d(np.asarray(S_t, dtype=float))[:, None]
+        T_t = np.atleast_1d(np.asarray(T_t, dtype=float))
+        r_d_t, r_f_t = [np.broadcast_to(np.asarray(r, dtype=float), (S_t.shape[0], T_t.shape[0]))
+                        for r in (r_d_t, r_f_t)]
+        T = np.broadcast_to(T_t, r_d_t.shape)
+        cc = cls(curr_pair=curr_pair, S_t=S_t[:, 0], r_d_t=r_d_t, r_f_t=r_f_t, T_t=T_t, NA=NA, market=market)
+        growth_f = _factor(r_f_t, T, 1, curve=curve)
+        cc.F_t = S_t * growth_f / _factor(r_d_t, T, 1, curve=curve)
+        cc.points = (cc.F_t - S_t) * np.reshape(np.asarray(pip, dtype=float), (-1, 1))
+        if F_0 is not None:
+            cc.F_0 = np.broadcast_to(np.asarray(F_0, dtype=float), cc.F_t.shape)
+            cc.V_t = np.asarray(NA, dtype=float) * (cc.F_0 - cc.F_t) / growth_f
+        return cc
+
+
+def _cip(S, F, r_d, r_f, T):
+    return -F + S * ((1 + r_f / 100) / (1 + r_d / 100)) ** T
+
+
+def _cip_value(F_0, F_t, r_f, T, V):
+    return -V + (F_0 - F_t) / (1 + r_f / 100) ** T
+
+
+# covered interest rate parity at 0 and t and the value at t, each solvable for any of its variables
+_CIP_RELATIONS = ((('S_0', 'F_0', 'r_d', 'r_f', 'T_0'), _cip),
+                  (('S_t', 'F_t', 'r_d_t', 'r_f_t', 'T_t'), _cip),
+                  (('F_0', 'F_t', 'r_f_t', 'T_t', 'V_t'), _cip_value))
+_CIP_SOLVERS = {}
+
+
+def _cip_solver(relation, unknown):
+    # the closed-form solution for unknown, derived once and compiled to a numpy function of the other variables
+    if (relation, unknown) not in _CIP_SOLVERS:
+        keys, equation = _CIP_RELATIONS[relation]
+        symbols = sym.symbols(keys)
+        solution = sym.solve(equation(*symbols), symbols[keys.index(unknown)])[0]
+        _CIP_SOLVERS[relation, unknown] = sym.lambdify([x for x in symbols if x.name != unknown], solution, 'numpy')
+    return _CIP_SOLVERS[relation, unknown]
+
+
+# pricing relations declared once as residual functions, any single missing variable is solved for numerically
+_RELATIONS = {}
+
+
+def register(name, keys, residual, brackets, defaults=None):
+    """
+        Declares the pricing relation name as residual(*values) = 0 over the variables keys.\n
+        brackets maps every variable to the interval (low, high) searched for its root, defaults holds
+        values used when a variable is not passed to :func:`solve`.
+    """
+    _RELATIONS[name] = (tuple(keys), residual, dict(brackets), dict(defaults or {}))
+
+
+@instrumented
+def solve(relation, tol=1e-10, max_iter=100, **kwargs):
+    """
+        Solves a registered relation for its one missing variable across arrays of contracts.\n
+        All given variables are broadcast against each other. The missing variable is found with a
+        vectorized safeguarded secant method inside its bracket, contracts without a sign change of the
+        residual inside the bracket are NaN and not converged.
+
+        Parameters:
+            relation : name of the registered relation
+            tol      : tolerance of the residual and of the bracket width
+            max_iter : maximum number of iterations
+            kwargs   : the variables of the relation, exactly one of them missing or None
+        Returns:
+            (:obj:`numpy.ndarray`, :obj:`numpy.ndarray`) - the missing variable and the convergence mask
+        Raises:
+            ValueError: raised if the relation is unknown or not exactly one variable is missing
+    """
+    if relation not in _RELATIONS:
+        raise ValueError('unknown relation {}, registered are {}'.format(relation, ', '.join(_RELATIONS)))
+    keys, residual, brackets, defaults = _RELATIONS[relation]
+    values = dict(defaults, **{k: v for k, v in kwargs.items() if k in keys})
+    missing = [k for k in keys if values.get(k) is None]
+    if len(missing) != 1:
+        raise ValueError('{} needs exactly one missing variable of {}, got {}'.format(relation, keys, missing))
+    unknown = missing[0]
+    known = np.broadcast_arrays(*[np.atleast_1d(np.asarray(values[k], dtype=float)) for k in keys if k != unknown])
+    position = keys.index(unknown)
+
+    def f(index, x):
+        args = [v[index] for v in known]
+        args.insert(position, x)
+        with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+            return residual(*args)
+
+    low, high = brackets[unknown]
+    return _find_root(f, np.full(known[0].shape, float(low)), np.full(known[0].shape, float(high)), tol, max_iter)
+
+
+def _solve_attributes(contract, relation, **values):
+    # solve relation for the one attribute of contract that is None, scalar inputs give a scalar
+    keys = _RELATIONS[relation][0]
+    values = dict({k: getattr(contract, k, None) for k in keys}, **values)
+    x, converged = solve(relation, **values)
+    unknown = [k for k in keys if values[k] is None][0]
+    if not converged.all():
+        logger.warning('%s: %s did not converge for %d contracts', relation, unknown, np.sum(~converged))
+    setattr(contract, unknown, x[0] if all(np.ndim(v) == 0 for v in values.values()) else x)
+
+
+def _find_root(f, low, high, tol=1e-10, max_iter=100):
+    # vectorized root of f(index, x) inside [low, high], secant steps from the last two points and bisection
+    # whenever the step leaves the bracket, only the contracts not yet converged are evaluated
+    every = np.arange(low.size)
+    f_low, f_high = f(every, low), f(every, high)
+    x = np.full(low.size, np.nan)
+    converged = np.zeros(low.size, dtype=bool)
+    for end, f_end in ((low, f_low), (high, f_high)):
+        at_end = f_end == 0
+        x[at_end], converged[at_end] = end[at_end], True
+    active = every[(np.sign(f_low) * np.sign(f_high) < 0)]
+    # start with the regula falsi point
+    prev_x, prev_f = high[active], f_high[active]
+    guess = low[active] - f_low[active] * (high[active] - low[active]) / (f_high[active] - f_low[active])
+    for _ in range(max_iter):
+        if len(active) == 0:
+            break
+        f_guess = f(active, guess)
+        done = (np.abs(f_guess) <= tol) | (high[active] - low[active] <= tol * (1 + np.abs(guess)))
+        x[active[done]], converged[active[done]] = guess[done], True
+        left = np.sign(f_guess) == np.sign(f_low[active])
+        low[active] = np.where(left, guess, low[active])
+        f_low[active] = np.where(left, f_guess, f_low[active])
+        high[active] = np.where(left, high[active], guess)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            candidate = guess - f_guess * (guess - prev_x) / (f_guess - prev_f)
+        lo, hi = low[active], high[active]
+        inside = np.isfinite(candidate) & (candidate > lo) & (candidate < hi)
+        prev_x, prev_f = guess, f_guess
+        guess = np.where(inside, candidate, (lo + hi) / 2)
+        keep = ~done
+        active, guess, prev_x, prev_f = active[keep], guess[keep], prev_x[keep], prev_f[keep]
+    return x, converged
+
+
+_PRICE, _AMOUNT, _RATE = (0, 1e9), (-1e9, 1e9), (-99.99, 1000)
+
+register('equity_forward', ('s_0', 'f_0', 'r_c', 'gamma_c', 'theta_c', 't_0_exp'),
+         lambda s_0, f_0, r_c, gamma_c, theta_c, t_0_exp:
+         s_0 * _factor(r_c + theta_c - gamma_c, t_0_exp, convention='continuous') - f_0,
+         dict(s_0=_PRICE, f_0=_PRICE, r_c=_RATE, gamma_c=_RATE, theta_c=_RATE, t_0_exp=(0, 36500)),
+         dict(gamma_c=0, theta_c=0))
+register('equity_forward_discrete', ('s_0', 'f_0', 'r', 'gamma_0', 'theta_0', 't_0_exp'),
+         lambda s_0, f_0, r, gamma_0, theta_0, t_0_exp: (s_0 + theta_0 - gamma_0) * _factor(r, t_0_exp) - f_0,
+         dict(s_0=_PRICE, f_0=_PRICE, r=_RATE, gamma_0=_AMOUNT, theta_0=_AMOUNT, t_0_exp=(0, 36500)),
+         dict(gamma_0=0, theta_0=0))
+register('fra', ('FRA_0', 'L_near', 'L_far', 'h', 'm', 'NTD'),
+         lambda FRA_0, L_near, L_far, h, m, NTD: _factor(L_far, h + m, NTD, 'simple') -
+         _factor(L_near, h, NTD, 'simple') * _factor(FRA_0, m, NTD, 'simple'),
+         dict(FRA_0=_RATE, L_near=_RATE, L_far=_RATE, h=(0, 36500), m=(0, 36500), NTD=(1, 366)),
+         dict(NTD=360))
+register('fixed_income_forward', ('F_0', 'B_0', 'AI_0', 'AI_T', 'FVCI', 'r', 'T'),
+         lambda F_0, B_0, AI_0, AI_T, FVCI, r, T: _factor(r, T, 1) * (B_0 + AI_0) - AI_T - FVCI - F_0,
+         dict(F_0=_PRICE, B_0=_PRICE, AI_0=_AMOUNT, AI_T=_AMOUNT, FVCI=_AMOUNT, r=_RATE, T=(0, 100)),
+         dict(AI_0=0, AI_T=0, FVCI=0))
+register('currency_forward', ('S_0', 'F_0', 'r_d', 'r_f', 'T_0'), _cip,
+         dict(S_0=_PRICE, F_0=_PRICE, r_d=_RATE, r_f=_RATE, T_0=(0, 100)))
 
 
 class InterestRateSwap:
@@ -347,35 +1299,343 @@ class InterestRateSwap:
 
         Attributes
         ----------
-        curr_pair : string
-            denotes the domestic(DC) and the foreign currency(FC) DC/FC
-        r_d : int
-            denotes the number of total days during the coupon payment period
-        r_f : int
-            denotes the number of coupon payments per year
-        T : float
-            the stated annual coupon amount
+        PV : DataFrame, 1d array or YieldCurve
+            present value factors of the payment dates at initiation (second column of a DataFrame)
+        PV_t : DataFrame, 1d array or YieldCurve
+            present value factors of the remaining payment dates at valuation
+        dates : 1d array
+            days of the payment dates from initiation, needed to read a YieldCurve as PV
+        dates_t : 1d array
+            days of the remaining payment dates from valuation, needed to read a YieldCurve as PV_t,
+            dates if not given
+        r_fix : float
+            fixed swap rate per period at initiation
+        r_fix_t : float
+            fixed swap rate per period of a new swap with the remaining payment dates at valuation
+        v_t : float
+            value per 1 notional amount of receiving fixed at valuation
 
+        Methods
+        -------
+        calc(**kwargs):
+            calculates r_fix, r_fix_t and v_t
+        par_rates(pv, dates=None):
+            the fixed swap rates of all tenors of one curve of present value factors
+        value_book(pv, r_fix, n, NA=1, dates=None):
+            values a book of swaps with different fixed rates, notional amounts and remaining periods
 
 
     """
 
     def __init__(self, **kwargs):
-        allowed_keys = {'PV', 'r_fix', 'r_fix_t', 'v_t', 'PV_t'}
+        allowed_keys = {'PV', 'r_fix', 'r_fix_t', 'v_t', 'PV_t', 'dates', 'dates_t'}
         self.__dict__.update(dict(zip(allowed_keys, [None] * len(allowed_keys))))
         self.__dict__.update((k, v) for k, v in kwargs.items() if k in allowed_keys)
 
+    @instrumented
     def calc(self, **kwargs):
-        allowed_keys = {'PV', 'r_fix', 'r_fix_t', 'v_t', 'PV_t'}
+        allowed_keys = {'PV', 'r_fix', 'r_fix_t', 'v_t', 'PV_t', 'dates', 'dates_t'}
         self.__dict__.update((k, v) for k, v in kwargs.items() if k in allowed_keys)
+        dates_t = self.dates if self.dates_t is None else self.dates_t
         # calc r_fix
         if self.r_fix is None:
-            setattr(self, 'r_fix', (1 - self.PV.iloc[-1, 1]) / self.PV.iloc[:, 1].sum())
+            setattr(self, 'r_fix', _par_rates(_pv_factors(self.PV, self.dates))[-1])
         if self.r_fix_t is None and self.PV_t is not None:
-            setattr(self, 'r_fix_t', (1 - self.PV_t.iloc[-1, 1]) / self.PV_t.iloc[:, 1].sum())
+            setattr(self, 'r_fix_t', _par_rates(_pv_factors(self.PV_t, dates_t))[-1])
         if self.v_t is None and self.PV_t is not None and \
                 self.r_fix is not None and self.r_fix_t is not None:
-            setattr(self, 'v_t', (self.r_fix - self.r_fix_t) * self.PV_t.iloc[:, 1].sum())
+            setattr(self, 'v_t', (self.r_fix - self.r_fix_t) * _pv_factors(self.PV_t, dates_t).sum())
+
+    @classmethod
+    @instrumented
+    def par_rates(cls, pv, dates=None):
+        """
+            Calculates the fixed swap rates of all tenors of one curve in one pass.
+
+            Parameters:
+                pv    : 1d array of present value factors of the payment dates, a DataFrame with them in
+                        the second column or a :obj:`YieldCurve`
+                dates : 1d array of days of the payment dates, needed with a YieldCurve
+            Returns:
+                :obj:`numpy.ndarray` - fixed rate per period of the swap ending at every payment date
+        """
+        return _par_rates(_pv_factors(pv, dates))
+
+    @classmethod
+    @instrumented
+    def value_book(cls, pv, r_fix, n, NA=1, dates=None):
+        """
+            Values a book of swaps with one curve in one array computation.\n
+            Swap i has n[i] remaining payment dates, the first n[i] dates of the curve. Its value is that of
+            receiving the fixed rate r_fix[i] per period on NA[i], a negative NA pays fixed.
+
+            Parameters:
+                pv    : 1d array of present value factors of the payment dates at valuation or a :obj:`YieldCurve`
+                r_fix : 1d array of fixed rates per period
+                n     : 1d array of numbers of remaining payment dates
+                NA    : 1d array of notional amounts
+                dates : 1d array of days of the payment dates, needed with a YieldCurve
+            Returns:
+                :obj:`numpy.ndarray` - value of every swap
+        """
+        return _swap_values(_pv_factors(pv, dates), r_fix, n, NA)
+
+    @classmethod
+    @instrumented
+    def risk(cls, curve, dates, r_fix, n, NA=1, bp=1):
+        """
+            Bucketed DV01 of a book of swaps as in :meth:`value_book`, the change in value of every swap when
+            the zero rate of one node of the curve rises by bp basis points, for all nodes in one batch.
+
+            Parameters:
+                curve : :obj:`YieldCurve`
+                dates : 1d array of days of the payment dates
+                r_fix : 1d array of fixed rates per period
+                n     : 1d array of numbers of remaining payment dates
+                NA    : 1d array of notional amounts
+                bp    : size of the bumps in basis points
+            Returns:
+                :obj:`pandas.DataFrame` - value changes with one row per swap and one column per node
+        """
+        return _bucket_risk(_swap_values(_bucket_pv(curve, dates, bp), r_fix, n, NA), curve.days)
+
+
+class SwapBook:
+    """
+        A class to represent a book of interest rate swaps valued against one curve and revalued incrementally.
+
+        Swap i receives the fixed rate r_fix[i] per period on NA[i] for its n[i] remaining payment dates, the
+        first n[i] dates of the curve, and is worth NA * (r_fix * A_n - (1 - pv_n)) with the annuity A_n, the
+        sum of the first n present value factors. The book keeps the annuities and per tenor the sums of
+        NA * r_fix and NA. A curve update naming its changed nodes shifts the annuities of the later tenors
+        and the book value in proportion to the number of changed nodes, the value of every swap is then
+        read off with one gather over the book instead of summing over all tenors again.
+
+        ...
+
+        Attributes
+        ----------
+        pv : 1d array
+            present value factors of the payment dates (nodes)
+        dates : 1d array
+            days of the payment dates, needed for updates from a :obj:`YieldCurve`
+        annuity : 1d array
+            annuity of every tenor, the cumulative sum of pv
+        value : float
+            value of the whole book
+
+        Methods
+        -------
+        update(nodes, pv=None, curve=None):
+            sets the present value factors of the changed nodes, taken from pv or read from curve at their
+            dates, and returns v_t, a node given more than once takes its last value
+        v_t:
+            value of every swap
+
+
+        """
+
+    def __init__(self, pv, r_fix, n, NA=1, dates=None):
+        self.dates = None if dates is None else np.asarray(dates, dtype=float)
+        self.pv = np.array(_pv_factors(pv, self.dates), dtype=float)
+        r_fix, n, NA = np.broadcast_arrays(np.asarray(r_fix, dtype=float), np.asarray(n, dtype=int),
+                                           np.asarray(NA, dtype=float))
+        self._index, self._rate_weight, self._notional = n - 1, NA * r_fix, NA
+        self.annuity = np.cumsum(self.pv)
+        size = len(self.pv)
+        # sum of NA * r_fix of all swaps paying on a node, i.e. with a tenor at or after it
+        self._paying = np.cumsum(np.bincount(self._index, self._rate_weight, size)[::-1])[::-1]
+        self._ending = np.bincount(self._index, self._notional, size)
+        self.value = float(np.sum(self._paying * self.pv) + np.sum(self._ending * (self.pv - 1)))
+        self._v_t = None
+
+    @instrumented
+    def update(self, nodes, pv=None, curve=None):
+        nodes = np.atleast_1d(np.asarray(nodes, dtype=int))
+        pv = curve.pv(self.dates[nodes]) if curve is not None else np.asarray(pv, dtype=float)
+        # a node given more than once takes its last value
+        pv = np.broadcast_to(pv, nodes.shape)[::-1]
+        nodes, last = np.unique(nodes[::-1], return_index=True)
+        pv = pv[last]
+        delta = pv - self.pv[nodes]
+        self.pv[nodes] = pv
+        self.value += float(np.sum(delta * (self._paying[nodes] + self._ending[nodes])))
+        # the annuities from every changed node on move by its change
+        step = np.zeros(len(self.pv))
+        step[nodes] = delta
+        self.annuity += np.cumsum(step)
+        self._v_t = None
+        return self.v_t
+
+    @property
+    def v_t(self):
+        if self._v_t is None:
+            self._v_t = self._rate_weight * self.annuity[self._index] - self._notional * (1 - self.pv[self._index])
+        return self._v_t
+
+
+def _pv_factors(pv, dates=None):
+    # the present value factors of a DataFrame with them in the second column, of an array or of a YieldCurve
+    if isinstance(pv, YieldCurve):
+        return pv.pv(dates)
+    return np.asarray(pv.iloc[:, 1] if isinstance(pv, pd.DataFrame) else pv, dtype=float)
+
+
+def _par_rates(pv):
+    # the swap ending at date k has the fixed rate (1 - pv_k) / (pv_1 + ... + pv_k)
+    return (1 - pv) / np.cumsum(pv, axis=-1)
+
+
+def _swap_values(pv, r_fix, n, NA=1):
+    # receiving r_fix is worth the difference to the par rate on the annuity of the remaining dates
+    # of every swap on every curve if pv holds one curve per row
+    annuity = np.cumsum(pv, axis=-1)
+    n = np.asarray(n, dtype=int) - 1
+    return np.asarray(NA, dtype=float) * (np.asarray(r_fix, dtype=float) * annuity[..., n] - (1 - pv[..., n]))
+
+
+def _bucket_pv(curve, dates, bp=1):
+    # present value factors at dates on the curve (row 0) and with the zero rate of each node bumped by bp basis
+    # points (row 1 + node), every bumped curve is read at all dates at once
+    shift = bp / 1e4 * curve.days / curve.ntd
+    rows = [curve.pv(dates)]
+    for node in range(len(curve.days)):
+        log_pv = curve.log_pv.copy()
+        log_pv[node] -= shift[node]
+        rows.append(_yield_curve(curve.days, log_pv, curve.interpolation, curve.ntd).pv(dates))
+    return np.array(rows)
+
+
+def _bucket_risk(values, buckets):
+    # value changes of the positions (columns of values) for the bumps (rows 1, 2, ...) of the base (row 0)
+    return pd.DataFrame((values[1:] - values[0]).T, columns=pd.Index(buckets, name='bucket'))
+
+
+@instrumented
+def key_rate_durations(dv01, value, bp=1):
+    """
+        Key rate durations -dV / (V * dy) from the bucketed value changes of a risk method.
+
+        Parameters:
+            dv01  : :obj:`pandas.DataFrame` value change of every position (rows) per bucket (columns)
+            value : 1d array of the values of the positions
+            bp    : size of the bumps in basis points
+        Returns:
+            :obj:`pandas.DataFrame` - key rate durations, NaN for positions worth 0
+    """
+    value = np.asarray(value, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return -dv01.div(np.where(value == 0, np.nan, value) * bp / 1e4, axis=0)
+
+
+class CurrencyGraph:
+    """
+        A class to represent a currency market built once from a set of quoted exchange rates.
+
+        A quote {'AUD/USD': 1.140} is 1.140 AUD per USD. The quoted pairs are the edges of a graph of
+        currencies, every connected part is spanned from its most quoted currency, so every cross rate is
+        the product of the quotes along one triangulation path and all cross rates are consistent with
+        each other. All rates, their inverses and paths are precomputed and looked up in O(1).
+
+        ...
+
+        Attributes
+        ----------
+        quotes : dict
+            the quoted exchange rates {'AUD/USD': 1.140, 'EUR/USD': 0.92}
+        currencies : list
+            all currencies in order of their first quote
+        index : dict
+            position of every currency in currencies
+
+        Methods
+        -------
+        rate(pair):
+            exchange rate of 'P/Q' (units of P per unit of Q), pair may also be a tuple (P, Q)
+        rates(pairs):
+            exchange rates of a sequence of pairs as :obj:`numpy.ndarray`
+        path(pair):
+            triangulation path of currencies from P to Q
+        convert(amount, from_curr, to_curr):
+            converts amount in from_curr to to_curr
+
+
+    """
+
+    def __init__(self, quotes):
+        self.quotes = dict(quotes)
+        edges = [tuple(pair.split('/')) + (float(x),) for pair, x in self.quotes.items()]
+        self.currencies = list(dict.fromkeys(c for p, q, _ in edges for c in (p, q)))
+        self.index = {c: i for i, c in enumerate(self.currencies)}
+        # neighbours with the units of the neighbour per unit of the currency
+        neighbours = {c: [] for c in self.currencies}
+        for p, q, x in edges:
+            neighbours[q].append((p, x))
+            neighbours[p].append((q, 1 / x))
+        # value of every currency in units of the root of its part, parents along breadth first search
+        n = len(self.currencies)
+        value, part, parent = np.full(n, np.nan), np.full(n, -1), {}
+        for root in sorted(self.currencies, key=lambda c: -len(neighbours[c])):
+            if part[self.index[root]] >= 0:
+                continue
+            value[self.index[root]], part[self.index[root]], parent[root] = 1.0, self.index[root], None
+            queue = [root]
+            for c in queue:
+                for other, x in neighbours[c]:
+                    if part[self.index[other]] < 0:
+                        value[self.index[other]] = value[self.index[c]] / x
+                        part[self.index[other]], parent[other] = self.index[root], c
+                        queue.append(other)
+        with np.errstate(invalid='ignore'):
+            self._rates = np.where(part[:, None] == part, value[None, :] / value[:, None], np.nan)
+        self._paths = {}
+        for p in self.currencies:
+            up_p = self._to_root(p, parent)
+            for q in self.currencies:
+                up_q = self._to_root(q, parent)
+                if up_p[-1] == up_q[-1]:
+                    common = next(c for c in up_p if c in up_q)
+                    self._paths[p, q] = tuple(up_p[:up_p.index(common) + 1] + up_q[:up_q.index(common)][::-1])
+        deviation = max((abs(self.rate(p, q) / x - 1) for p, q, x in edges), default=0)
+        if deviation > 1e-6:
+            logger.warning('quotes are not consistent, cross rates deviate by up to %.2e from quotes', deviation)
+
+    @staticmethod
+    def _to_root(c, parent):
+        up = [c]
+        while parent[up[-1]] is not None:
+            up.append(parent[up[-1]])
+        return up
+
+    def _split(self, pair, quote=None):
+        return tuple(pair.split('/')) if quote is None and isinstance(pair, str) else \
+            (pair, quote) if quote is not None else tuple(pair)
+
+    def rate(self, pair, quote=None):
+        p, q = self._split(pair, quote)
+        x = self._rates[self.index[p], self.index[q]]
+        if np.isnan(x):
+            raise ValueError('no exchange rate between {} and {}'.format(p, q))
+        return x
+
+    def rates(self, pairs):
+        p, q = zip(*[self._split(pair) for pair in pairs])
+        return self._rates[[self.index[c] for c in p], [self.index[c] for c in q]]
+
+    def path(self, pair, quote=None):
+        p, q = self._split(pair, quote)
+        if (p, q) not in self._paths:
+            raise ValueError('no exchange rate between {} and {}'.format(p, q))
+        return self._paths[p, q]
+
+    def convert(self, amount, from_curr, to_curr):
+        return amount * self.rate(to_curr, from_curr)
+
+
+@functools.lru_cache(maxsize=128)
+def _currency_graph(quotes):
+    # graphs of repeatedly used quote dicts, quotes is a sorted tuple of items
+    return CurrencyGraph(dict(quotes))
 
 
 class CurrencySwap:
@@ -398,9 +1658,23 @@ class CurrencySwap:
             {NAD: [90, 180, 270, 360], AUD: [2.50, 2.60, 2.70, 2.80], USD: [0.10, 0.15, 0.20, 0.25]}
         pv        : dict
             {NAD: [90, 180, 270, 360], AUD: [0.993789, 0.987167, 0.980152, 0.972763],
-            USD: [0.10, 0.15, 0.20, 0.25]}
+            USD: [0.10, 0.15, 0.20, 0.25]}, a :obj:`YieldCurve` per currency is read at NAD
         r_fix    : dict
             {AUD: 0.0277, USD:0.0025}
+        curve     : DiscountCurve
+            shared discount factor service used to convert spot_rates into pv (optional)
+        market    : CurrencyGraph
+            shared currency market used to convert the notional amounts, built from exchange_rate if not given
+        v_t       : float
+            value of receiving DC and paying FC, calculated by calc
+        fx_delta  : float
+            change of v_t per unit change of the spot rate DC/FC, calculated by calc
+
+        Methods
+        -------
+        calc(pv_t=None, market_t=None, reporting=None):
+            values the swap at t with the remaining payment dates and curves in pv_t (same layout as pv) and
+            the spot rates of market_t, through a :obj:`CurrencySwapBook`
 
 
 
@@ -409,19 +1683,21 @@ class CurrencySwap:
 
     def __init__(self, **kwargs):
         allowed_keys = {'na', 'curr_pair', 'ntd', 'exchange_rate', 'spot_rates', 'pv', 'r_fix', 'fixed_pay'}
-        self.__dict__.update(dict(zip(allowed_keys, [{}] * len(allowed_keys))))
+        self.__dict__.update({k: {} for k in allowed_keys})
         self.__dict__.update((k, v) for k, v in kwargs.items() if k in allowed_keys)
+        self.curve = kwargs.get('curve')
+        self.market = kwargs.get('market')
+        if self.market is None and len(self.exchange_rate) != 0:
+            self.market = _currency_graph(tuple(sorted(self.exchange_rate.items())))
         if 'FC' in self.curr_pair and 'DC' in self.curr_pair \
                 and isinstance(self.curr_pair['FC'], str) and isinstance(self.curr_pair['DC'], str):
             pass
         else:
-            print('Currency pair must be specified as dictionary \
-                  {''DC'': ''EUR'', ''FC'': ''USD''}')
-            raise TypeError
+            raise TypeError("Currency pair must be specified as dictionary {'DC': 'EUR', 'FC': 'USD'}")
         # if fixed rates are not specified try to calculate from
         # pv (present values) or first pv from spot_rates
         if len(self.r_fix) != 2:
-            print('No fixed rates specified. Trying to calculate')
+            logger.info('No fixed rates specified. Trying to calculate')
             # no pv then try to calculate from spot_rates
             self.calc_r_fix()
         # Calculate notional amount na
@@ -431,30 +1707,30 @@ class CurrencySwap:
         self.fixed_pay = dict()
         self.calc_fixed_pay()
 
+    @instrumented
     def calc_r_fix(self):
         for curr in self.curr_pair.values():
+            if isinstance(self.pv.get(curr), YieldCurve):
+                self.pv[curr] = self.pv[curr].pv(self.pv['NAD']).tolist()
             if len(self.pv) != 3 and len(self.spot_rates) == 3:
                 self.pv['NAD'] = self.spot_rates['NAD']
-                self.pv[curr] = 1 / (1 + (np.array(self.spot_rates[curr]) / 100 *
-                                          np.array(self.spot_rates['NAD']) / 360))
+                self.pv[curr] = 1 / _factor(np.array(self.spot_rates[curr]), np.array(self.spot_rates['NAD']),
+                                            360, 'simple', self.curve)
                 self.pv[curr] = self.pv[curr].tolist()
             elif len(self.pv) == 0 and len(self.spot_rates) == 0:
-                print('Neither fixed rates nor present values nor interest rates are specified!')
-                raise TypeError
+                raise TypeError('Neither fixed rates nor present values nor interest rates are specified!')
 
             self.r_fix[curr] = (1 - np.array(self.pv[curr][-1])) / \
                                np.array(self.pv[curr]).sum() * 360 / \
                                (self.pv['NAD'][1] - self.pv['NAD'][0])
 
+    @instrumented
     def calc_na(self):
         if len(self.na) == 0:
-            print('Notional amount not specified. ')
+            logger.warning('Notional amount not specified.')
         elif len(self.na) != 0:
-            # correct exchange rate if necesary
-            if list(self.exchange_rate.keys())[0].split('/')[1] == self.curr_pair['FC']:
-                ex_rate = self.exchange_rate[list(self.exchange_rate.keys())[0]]
-            else:
-                ex_rate = 1 / self.exchange_rate[list(self.exchange_rate.keys())[0]]
+            # units of DC per unit of FC
+            ex_rate = self.market.rate(self.curr_pair['DC'], self.curr_pair['FC'])
 
             if self.na[self.curr_pair['DC']] is None:
                 self.na[self.curr_pair['DC']] = self.na[self.curr_pair['FC']] * ex_rate
@@ -462,6 +1738,7 @@ class CurrencySwap:
             elif self.na[self.curr_pair['FC']] is None:
                 self.na[self.curr_pair['FC']] = self.na[self.curr_pair['DC']] * (1 / ex_rate)
 
+    @instrumented
     def calc_fixed_pay(self):
         self.fixed_pay[self.curr_pair['FC']] = self.na[self.curr_pair['FC']] * self.r_fix[self.curr_pair['FC']] * \
                                                (self.pv['NAD'][1] - self.pv['NAD'][0]) / 360
@@ -480,39 +1757,453 @@ class CurrencySwap:
 
 
 
+    @instrumented
     def calc(self, **kwargs):
-        pass
-        # allowed_keys = {'data_ir', 'data_pv'}
-        # self.__dict__.update((k, v) for k, v in kwargs.items() if k in allowed_keys)
-        # if self.curr_pair is None:
-        #     self.get_curr_pair()
-        # # calc PV
-        # if self.data_pv is None and self.data_ir is not None:
-        #     self.data_pv = self.data_ir.rename(
-        #         columns={list(self.data_ir.columns)[1]:
-        #                      self.curr_pair[0] + ' Present Value',
-        #                  list(self.data_ir.columns)[2]:
-        #                      self.curr_pair[1] + ' Present Value'})
-        #     increment = self.data_pv.iloc[1, 0] - self.data_pv.iloc[0, 0]
-        #     for i in range(1, 3):
-        #         self.data_pv.iloc[:, i] = 1 / (1 + (self.data_pv.iloc[:, i] / 100 *
-        #                                             self.data_pv.iloc[:, 0] / 360))
-        #
-        #         self.r_fix[self.curr_pair[i - 1]] = (1 - self.data_pv.iloc[-1, i]) / \
-        #                                             self.data_pv.iloc[:, i].sum() * 360 / increment
-        #
-        #     print(self.r_fix)
+        allowed_keys = {'pv_t', 'market_t', 'reporting'}
+        values = {k: v for k, v in kwargs.items() if k in allowed_keys}
+        # value at t with the remaining payment dates and the curves in pv_t, by default the initial ones
+        pv_t = values.get('pv_t', self.pv)
+        market = values.get('market_t', self.market)
+        dc, fc = self.curr_pair['DC'], self.curr_pair['FC']
+        book = CurrencySwapBook(DC=[dc], FC=[fc], NA=[self.na[fc]], NA_DC=[self.na[dc]], n=[len(pv_t['NAD'])],
+                                period=self.pv['NAD'][1] - self.pv['NAD'][0], first=[pv_t['NAD'][0]],
+                                r_fix_DC=[self.r_fix[dc]],
+                                r_fix_FC=[self.r_fix[fc]], curves={c: v for c, v in pv_t.items() if c != 'NAD'},
+                                market=market, reporting=values.get('reporting'))
+        book.calc()
+        self.v_t, self.fx_delta = book.v_t[0], book.fx_delta[0]
+
+
+class CurrencySwapBook:
+    """
+        A class to represent a book of fixed-for-fixed currency swaps held as columns of arrays.
 
+        Swap i exchanges NA[i] in its foreign currency FC[i] against the equivalent in its domestic currency
+        DC[i] at the spot rate, receives the fixed rate r_fix_DC[i] on the DC notional and pays r_fix_FC[i] on
+        the FC notional every period days for n[i] remaining periods, the first of them in first[i] days,
+        and both notionals are exchanged back at the end. All swaps of a currency share its curve. Fixed
+        rates that are not given (NaN) are the par rates of the curves, then the swap is worth 0 at
+        initiation. A negative NA pays DC and receives FC.
 
-def equity_swap(**kwargs):
-    df = pd.DataFrame(kwargs, index=[0])
+        ...
+
+        Attributes
+        ----------
+        DC, FC : 1d array
+            domestic and foreign currency of every swap
+        NA : 1d array
+            notional amounts in FC
+        n : 1d array
+            numbers of remaining payment dates
+        period : int
+            days between two payment dates (default 90)
+        first : 1d array
+            days until the first remaining payment date (default period)
+        r_fix_DC, r_fix_FC : 1d array
+            annual fixed rates (0.0277 for 2.77 %), NaN for the par rate
+        curves : dict
+            per currency a :obj:`YieldCurve`, read at the remaining payment dates of every swap, or the
+            present value factors of the payment dates {'AUD': YieldCurve, 'USD': [0.999750, 0.999251, ...]}
+        market : CurrencyGraph
+            spot rates of all currencies
+        reporting : string
+            currency of v_t, DC of every swap if not given
+        ntd : int
+            number of total days in a year (default 360)
+        r_par_DC, r_par_FC : 1d array
+            par fixed rates of the legs
+        NA_DC : 1d array
+            notional amounts in DC, fixed at initiation for existing swaps, NaN or not given for the
+            equivalent of NA at spot
+        fixed_pay_DC, fixed_pay_FC : 1d array
+            periodic fixed payments of the legs in DC resp. FC
+        v_t : 1d array
+            value of every swap in the reporting currency
+        fx_delta : 1d array
+            change of v_t per unit change of the spot rate DC/FC, the reporting rate held fixed
+
+        Methods
+        -------
+        calc():
+            calculates all results for the whole book in one vectorized pass
+        risk(bp=1):
+            bucketed DV01 of every swap to the nodes of all currency curves given as :obj:`YieldCurve`
+
+
+        """
+
+    def __init__(self, **kwargs):
+        allowed_keys = {'DC', 'FC', 'NA', 'n', 'period', 'first', 'r_fix_DC', 'r_fix_FC', 'curves', 'market',
+                        'reporting', 'ntd', 'r_par_DC', 'r_par_FC', 'NA_DC', 'fixed_pay_DC', 'fixed_pay_FC', 'v_t',
+                        'fx_delta'}
+        self.__dict__.update(dict(zip(allowed_keys, [None] * len(allowed_keys))))
+        self.period, self.ntd = 90, 360
+        self.__dict__.update((k, v) for k, v in kwargs.items() if k in allowed_keys)
+
+    @instrumented
+    def calc(self):
+        DC, FC = np.asarray(self.DC), np.asarray(self.FC)
+        NA, n = np.asarray(self.NA, dtype=float), np.asarray(self.n, dtype=int)
+        # present value factors and annuities of both legs of every swap on its remaining payment dates
+        dates = self._payment_dates()
+        rows, last = np.arange(len(DC)), n - 1
+        alpha = self.period / self.ntd
+        pv_d, pv_f = self._leg_pv(DC, dates), self._leg_pv(FC, dates)
+        annuity_d, annuity_f = np.cumsum(pv_d, axis=1)[rows, last], np.cumsum(pv_f, axis=1)[rows, last]
+        pv_d, pv_f = pv_d[rows, last], pv_f[rows, last]
+        self.r_par_DC = (1 - pv_d) / annuity_d / alpha
+        self.r_par_FC = (1 - pv_f) / annuity_f / alpha
+        r_d = self.r_par_DC if self.r_fix_DC is None else \
+            np.where(np.isnan(np.asarray(self.r_fix_DC, dtype=float)), self.r_par_DC, self.r_fix_DC)
+        r_f = self.r_par_FC if self.r_fix_FC is None else \
+            np.where(np.isnan(np.asarray(self.r_fix_FC, dtype=float)), self.r_par_FC, self.r_fix_FC)
+        # units of DC per unit of FC
+        spot = self.market.rates(list(zip(DC, FC)))
+        NA_DC = NA * spot if self.NA_DC is None else np.asarray(self.NA_DC, dtype=float)
+        self.NA_DC = np.where(np.isnan(NA_DC), NA * spot, NA_DC)
+        self.fixed_pay_DC = self.NA_DC * r_d * alpha
+        self.fixed_pay_FC = NA * r_f * alpha
+        # both legs are valued like bonds, the FC leg converted at spot
+        value_d = self.NA_DC * (r_d * alpha * annuity_d + pv_d)
+        value_f = NA * (r_f * alpha * annuity_f + pv_f)
+        self.v_t = (value_d - value_f * spot) * self._reporting_rates()
+        self.fx_delta = -value_f * self._reporting_rates()
+
+    @instrumented
+    def risk(self, bp=1):
+        """
+            Bucketed DV01 of the book after :meth:`calc`, the change in v_t of every swap when the zero rate
+            of one node of one currency curve rises by bp basis points. All nodes of a curve are bumped in
+            one batch, the notionals and fixed payments stay as calculated.
+
+            Parameters:
+                bp : size of the bumps in basis points
+            Returns:
+                :obj:`pandas.DataFrame` - value changes with one row per swap and one column per currency
+                and node
+        """
+        DC, FC = np.asarray(self.DC), np.asarray(self.FC)
+        NA, last = np.asarray(self.NA, dtype=float), np.asarray(self.n, dtype=int) - 1
+        dates, rows = self._payment_dates(), np.arange(len(DC))
+        spot = self.market.rates(list(zip(DC, FC)))
+        frames = []
+        for currency, curve in sorted(self.curves.items()):
+            if not isinstance(curve, YieldCurve):
+                continue
+            pv = _bucket_pv(curve, dates, bp)
+            annuity = np.cumsum(pv, axis=2)[:, rows, last]
+            pv = pv[:, rows, last]
+            # legs of the swaps in this currency on the base (row 0) and the bumped curves
+            value_d = self.fixed_pay_DC * annuity + self.NA_DC * pv
+            value_f = self.fixed_pay_FC * annuity + NA * pv
+            values = np.where(DC == currency, value_d, 0) - np.where(FC == currency, value_f * spot, 0)
+            frame = _bucket_risk(values * self._reporting_rates(), curve.days)
+            frame.columns = pd.MultiIndex.from_product([[currency], curve.days], names=['currency', 'bucket'])
+            frames.append(frame)
+        return pd.concat(frames, axis=1)
+
+    def _payment_dates(self):
+        # days of the remaining payment dates, one row per swap
+        n = np.asarray(self.n, dtype=int)
+        first = self.period if self.first is None else self.first
+        first = np.broadcast_to(np.asarray(first, dtype=float), n.shape)
+        return first[:, None] + self.period * np.arange(n.max())
+
+    def _leg_pv(self, currencies, dates):
+        # present value factors of the payment dates of every swap in the currency of its leg
+        pv = np.full(dates.shape, np.nan)
+        for currency in np.unique(currencies):
+            rows, curve = currencies == currency, self.curves[currency]
+            if isinstance(curve, YieldCurve):
+                pv[rows] = curve.pv(dates[rows])
+            else:
+                factors = np.asarray(curve, dtype=float)[:dates.shape[1]]
+                pv[rows, :len(factors)] = factors
+        return pv
 
-    cf = df['NA'] * (df['equity_return'] - df['pay_fixed']) / 100
-    print(type(cf[0]))
+    def _reporting_rates(self):
+        if self.reporting is None:
+            return 1
+        return self.market.rates([(self.reporting, d) for d in np.asarray(self.DC)])
 
-    print('cash flow for receive-equity (pay-fixed) {:>15}'.format(cf[0]))
-    print('cash flow for receive-fixed (pay-equity) {:>15}'.format(-cf[0]))
 
+_BOOK_FIELDS = {'equity': ('s_0', 'r', 'r_c', 't_0_exp', 't', 's_t', 'gamma_c', 'theta_c',
+                           'f_0', 'f_t', 'value_t'),
+                'fra': ('NA', 'h', 'm', 'g', 'L_h', 'D_h', 'FRA_0', 'FRA_g', 'pay_set', 'value_g'),
+                'fixed_income': ('B_0', 'AI_0', 'AI_T', 'FVCI', 'CF', 'r', 'T', 'F_0', 'QF_0', 'F_t', 'V_t'),
+                'currency': ('S_0', 'F_0', 'r_d', 'r_f', 'T_0', 'S_t', 'F_t', 'r_d_t', 'r_f_t', 'T_t', 'V_t')}
+_BOOK_CONTRACTS = {'equity': EquityForward, 'fra': FRA, 'fixed_income': FixedIncomeForward,
+                   'currency': CurrencyContracts}
+
+
+class ForwardBook:
+    """
+        A class to represent a columnar book of forward positions of one kind.
+
+        Every position is one row of a :obj:`numpy.ndarray` with a structured float64 dtype, so a
+        position costs 8 bytes per field (88 bytes for an equity forward) instead of a contract object
+        with its __dict__ and attribute values (about 1.2 KB for an :obj:`EquityForward`, 0.7-0.8 KB for
+        the others). Missing inputs and results not calculated yet are NaN, continuous benefits and costs
+        default to 0.
+
+        ...
+
+        Attributes
+        ----------
+        kind : string
+            'equity' (:obj:`EquityForward`), 'fra' (:obj:`FRA`), 'fixed_income' (:obj:`FixedIncomeForward`)
+            or 'currency' (:obj:`CurrencyContracts`)
+        data : numpy.ndarray
+            structured array with one field per attribute of the contract class
 
-def fixed_rate(df):
-    return (1 - df[-1]) / sum(df)
+        Methods
+        -------
+        from_arrays(kind, **kwargs):
+            creates a book from scalars or 1d arrays per field
+        price(curve=None):
+            calculates the results of all positions in one vectorized pass and stores them in data
+        memory_comparison():
+            bytes used by the book compared to the same positions as contract objects
+
+
+        """
+
+    def __init__(self, kind, size=0):
+        if kind not in _BOOK_FIELDS:
+            raise ValueError('kind must be one of ' + ', '.join(_BOOK_FIELDS))
+        self.kind = kind
+        self.data = np.full(size, np.nan, dtype=[(field, np.float64) for field in _BOOK_FIELDS[kind]])
+        for field in {'gamma_c', 'theta_c'}.intersection(_BOOK_FIELDS[kind]):
+            self.data[field] = 0
+
+    @classmethod
+    @instrumented
+    def from_arrays(cls, kind, **kwargs):
+        columns = {k: v for k, v in kwargs.items() if k in _BOOK_FIELDS.get(kind, ())}
+        size = np.broadcast(*[np.atleast_1d(v) for v in columns.values()]).size if columns else 0
+        book = cls(kind, size)
+        for field, values in columns.items():
+            book.data[field] = values
+        return book
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        if isinstance(index, str):
+            return self.data[index]
+        return ForwardBookRow(self, range(len(self))[index])
+
+    def columns(self):
+        return {field: self.data[field] for field in self.data.dtype.names}
+
+    @instrumented
+    def price(self, curve=None):
+        data = self.data
+        if self.kind == 'equity':
+            equ = EquityForward.from_arrays(curve=curve, **self.columns())
+            data['f_0'], data['f_t'], data['value_t'] = equ.f_0, equ.f_t, equ.value_t
+        elif self.kind == 'fra':
+            data['pay_set'] = data['NA'] * ((data['FRA_0'] - data['L_h']) / 100 * data['m'] / 360) / \
+                _factor(data['D_h'], data['m'], 360, 'simple', curve)
+            data['value_g'] = data['NA'] * ((data['FRA_g'] - data['FRA_0']) / 100 * data['m'] / 360) / \
+                _factor(data['D_h'], data['h'] + data['m'] - data['g'], 360, 'simple', curve)
+        elif self.kind == 'fixed_income':
+            compound = _factor(data['r'], data['T'], 1, curve=curve)
+            f_0 = compound * (data['B_0'] + data['AI_0']) - data['AI_T'] - data['FVCI']
+            data['F_0'] = np.where(np.isnan(data['B_0']), data['F_0'], f_0)
+            data['QF_0'] = 1 / data['CF'] * data['F_0']
+            data['V_t'] = compound * (data['F_t'] - data['F_0'])
+        elif self.kind == 'currency':
+            f_0 = data['S_0'] * _factor(data['r_f'], data['T_0'], 1, curve=curve) / \
+                _factor(data['r_d'], data['T_0'], 1, curve=curve)
+            data['F_0'] = np.where(np.isnan(data['S_0']), data['F_0'], f_0)
+            f_t = data['S_t'] * _factor(data['r_f_t'], data['T_t'], 1, curve=curve) / \
+                _factor(data['r_d_t'], data['T_t'], 1, curve=curve)
+            data['F_t'] = np.where(np.isnan(data['S_t']), data['F_t'], f_t)
+            data['V_t'] = (data['F_0'] - data['F_t']) / _factor(data['r_f_t'], data['T_t'], 1, curve=curve)
+
+    def memory_comparison(self):
+        # size of one contract object with all attributes filled, including its __dict__ and values
+        contract = _BOOK_CONTRACTS[self.kind](**dict.fromkeys(_BOOK_FIELDS[self.kind], 1.0))
+        values = [v for v in contract.__dict__.values() if v is not None]
+        object_bytes = sys.getsizeof(contract) + sys.getsizeof(contract.__dict__) + \
+            sum(sys.getsizeof(v) for v in values) + \
+            sum(sys.getsizeof(x) for v in values if isinstance(v, list) for x in v)
+        return {'book_bytes': self.data.nbytes, 'book_bytes_per_row': self.data.itemsize,
+                'object_bytes': object_bytes * len(self), 'object_bytes_per_row': object_bytes}
+
+
+class ForwardBookRow:
+    """
+        Attribute view on one position of a :obj:`ForwardBook`, e.g. book[0].f_0, for code written against
+        the contract classes. Reads and writes go straight to the columns of the book.
+    """
+    __slots__ = ('_book', '_index')
+
+    def __init__(self, book, index):
+        object.__setattr__(self, '_book', book)
+        object.__setattr__(self, '_index', index)
+
+    def __getattr__(self, name):
+        if name not in self._book.data.dtype.names:
+            raise AttributeError(name)
+        return self._book.data[name][self._index]
+
+    def __setattr__(self, name, value):
+        if name not in self._book.data.dtype.names:
+            raise AttributeError(name)
+        self._book.data[name][self._index] = value
+
+
+class EquitySwapBook:
+    """
+        A class to represent a book of equity swaps with their reset schedules, valued against one panel of
+        equity returns and Libor.
+
+        Every swap receives the equity leg and pays the fixed rate pay_fixed or, where pay_fixed is NaN,
+        Libor set in advance plus spread. Resets are on the common panel dates every period days, swap i runs
+        the n[i] periods from panel period start[i] on. The equity leg of a swap pays
+
+        - 'return': the equity returns of the returns panel as given (return-only)
+        - 'price': the price return of the index levels in prices
+        - 'total': the price return plus the dividends paid during the period
+
+        With a variable notional the notional is reset every period by the return of the equity leg.
+        All rates and returns are in percentage, cash flows are those of receiving equity.
+
+        ...
+
+        Attributes
+        ----------
+        NA : 1d array
+            initial notional amounts
+        equity : 1d array
+            row of the equity index of every swap in the panels
+        leg : 1d array
+            'return', 'price' or 'total' per swap (default 'price')
+        pay_fixed : 1d array
+            annual fixed rates, NaN for floating
+        spread : 1d array
+            annual spread over Libor of floating legs (default 0)
+        start, n : 1d array
+            first panel period and number of periods of every swap
+        variable : 1d array
+            True for a notional reset every period (default False)
+        period : int
+            days between two resets (default 90)
+        returns : 2d array
+            equity returns per period of every index, indices x periods
+        prices : 2d array
+            index levels at the panel dates, indices x (periods + 1)
+        dividends : 2d array
+            dividends paid during every period, indices x periods (default 0)
+        libor : 1d array
+            annual Libor set at the beginning of every period, one more than the observed periods to value
+            floating legs
+        s_t : 1d array
+            current index levels for the valuation, without prices the equity returns in percentage since
+            the last reset
+        days : int
+            days since the last observed reset for the valuation (default 0)
+        curve : YieldCurve
+            discount curve of the valuation day
+        notional : 2d array
+            notional of every swap and period
+        cash_flows : 2d array
+            net cash flows of receiving equity of every swap and period, 0 outside of its term
+        v_t : 1d array
+            value of receiving equity after the observed periods, 0 after maturity, NaN before start
+
+        Methods
+        -------
+        calc():
+            calculates notional, cash_flows and, with s_t and curve, v_t for the whole book
+
+
+        """
+
+    def __init__(self, **kwargs):
+        allowed_keys = {'NA', 'equity', 'leg', 'pay_fixed', 'spread', 'start', 'n', 'variable', 'period', 'returns',
+                        'prices', 'dividends', 'libor', 's_t', 'days', 'curve', 'notional', 'cash_flows', 'v_t'}
+        self.__dict__.update(dict(zip(allowed_keys, [None] * len(allowed_keys))))
+        self.leg, self.spread, self.equity, self.start, self.variable = 'price', 0, 0, 0, False
+        self.period, self.days = 90, 0
+        self.__dict__.update((k, v) for k, v in kwargs.items() if k in allowed_keys)
+
+    @instrumented
+    def calc(self):
+        NA, equity, leg, pay_fixed, spread, start, n, variable = np.broadcast_arrays(*[np.atleast_1d(v) for v in (
+            np.asarray(self.NA, dtype=float), self.equity, self.leg, np.asarray(self.pay_fixed, dtype=float),
+            np.asarray(self.spread, dtype=float), self.start, self.n, self.variable)])
+        equity, start, n, variable = equity.astype(int), start.astype(int), n.astype(int), variable.astype(bool)
+        # equity returns in percentage of every kind of leg, kinds x indices x periods
+        panels = {}
+        if self.returns is not None:
+            panels['return'] = np.atleast_2d(np.asarray(self.returns, dtype=float))
+        if self.prices is not None:
+            prices = np.atleast_2d(np.asarray(self.prices, dtype=float))
+            dividends = 0 if self.dividends is None else np.atleast_2d(np.asarray(self.dividends, dtype=float))
+            panels['price'] = (prices[:, 1:] / prices[:, :-1] - 1) * 100
+            panels['total'] = ((prices[:, 1:] + dividends) / prices[:, :-1] - 1) * 100
+        missing = set(np.unique(leg)) - set(panels)
+        if missing:
+            raise ValueError('no panel for {} legs, returns or prices are missing'.format(', '.join(sorted(missing))))
+        kinds = sorted(panels)
+        stacked = np.stack([panels[k] for k in kinds])
+        periods = stacked.shape[2]
+        R = stacked[np.searchsorted(kinds, leg), equity]
+        k = np.arange(periods)
+        active = (k >= start[:, None]) & (k < (start + n)[:, None])
+        # pay leg in percentage per year, fixed or Libor set in advance plus spread
+        libor = np.full(periods + 1, np.nan) if self.libor is None else \
+            np.append(np.asarray(self.libor, dtype=float), np.full(max(periods + 1 - len(self.libor), 0), np.nan))
+        floating = np.isnan(pay_fixed)
+        rate = np.where(floating[:, None], libor[None, :periods] + spread[:, None], pay_fixed[:, None])
+        # notional reset by the growth of the equity leg since the start of the swap
+        log_growth = np.where(active, np.log1p(R / 100), 0)
+        growth = np.exp(np.cumsum(log_growth, axis=1) - log_growth)
+        self.notional = np.where(active, NA[:, None] * np.where(variable[:, None], growth, 1), 0)
+        self.cash_flows = self.notional * (R - rate * self.period / 360) / 100
+        if self.s_t is not None and self.curve is not None:
+            self.v_t = self._value(NA, equity, pay_fixed, spread, start, n, variable, log_growth, libor, periods)
+
+    def _value(self, NA, equity, pay_fixed, spread, start, n, variable, log_growth, libor, periods):
+        # equity leg grows with the index since the last reset, the pay leg is valued like a bond
+        remaining = start + n - periods
+        alive = (start <= periods) & (remaining > 0)
+        notional = NA * np.where(variable, np.exp(log_growth.sum(axis=1)), 1)
+        s_t = np.asarray(self.s_t, dtype=float)[equity]
+        if self.prices is None:
+            # return-only books observe the growth since the last reset directly
+            equity_leg = notional * (1 + s_t / 100)
+        else:
+            equity_leg = notional * s_t / np.atleast_2d(np.asarray(self.prices, dtype=float))[equity, -1]
+        pay_days = self.period * np.arange(1, max(remaining.max(), 1) + 1) - self.days
+        pv = self.curve.pv(pay_days)
+        last = np.clip(remaining, 1, None) - 1
+        fixed_leg = notional * (pay_fixed / 100 * self.period / 360 * np.cumsum(pv)[last] + pv[last])
+        # Libor set at the last reset is paid on the next date, afterwards the leg is worth par plus the
+        # annuity of the spread on the remaining dates
+        floating_leg = notional * ((1 + (libor[periods] + spread) / 100 * self.period / 360) * pv[0] +
+                                   spread / 100 * self.period / 360 * (np.cumsum(pv)[last] - pv[0]))
+        value = equity_leg - np.where(np.isnan(pay_fixed), floating_leg, fixed_leg)
+        return np.where(alive, value, np.where(start > periods, np.nan, 0))
+
+
+@instrumented
+def equity_swap(**kwargs):
+    # one period of a swap paying the fixed rate pay_fixed per period, rates and returns in percentage
+    period = {'monthly': 30, 'quarterly': 90, 'semiannual': 180, 'annual': 360}.get(kwargs.get('reset'), 90)
+    book = EquitySwapBook(NA=kwargs['NA'], leg='return', returns=[[kwargs['equity_return']]], n=1, period=period,
+                          pay_fixed=kwargs['pay_fixed'] * 360 / period)
+    book.calc()
+    cf = book.cash_flows[0, 0]
+    logger.info('cash flow for receive-equity (pay-fixed) %15s', cf)
+    logger.info('cash flow for receive-fixed (pay-equity) %15s', -cf)
+    return cf if kwargs.get('position', 're') == 're' else -cf
+
+
+@instrumented
+def fixed_rate(df, dates=None):
+    return _par_rates(_pv_factors(df, dates))[-1]
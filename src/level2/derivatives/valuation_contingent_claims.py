@@ -5,11 +5,18 @@
 
 from datetime import datetime, date
 import json
+import logging
 from random import randint
 
 import pandas as pd
 import numpy as np
 import sympy as sym
+from concurrent.futures import ProcessPoolExecutor
+
+from src.instrumentation import instrumented
+
+logger = logging.getLogger(__name__)
+
 
 class EquityForward:
     """
@@ -55,6 +62,7 @@ class EquityForward:
         self.gamma_c, self.theta_c = 0, 0
         self.__dict__.update((k, v) for k, v in kwargs.items() if k in allowed_keys)
 
+    @instrumented
     def f0(self):
 
         if self.r_c is not None:
@@ -73,8 +81,545 @@ class EquityForward:
                 theta_0 = theta_0 + thet / (1 + self.r / 100) ** (t / 360)
             self.f_0 = (self.s_0 + theta_0 - gamma_0) * (1 + self.r / 100) ** ((self.t_0_exp) / 360)
 
+    @instrumented
     def value(self):
         # calculate f_t and value of contract if 't' is in the inputs
         if hasattr(self, 't') and hasattr(self, 's_t'):
             self.f_t = self.s_t * (1 + self.r / 100) ** ((self.t_0_exp - self.t) / 360)
             self.value_t = (self.f_t - self.f_0) / (1 + self.r / 100) ** ((self.t_0_exp - self.t) / 360)
+
+
+class BinomialOption:
+    """
+        A class to represent European and American calls and puts priced on a binomial lattice.
+
+        All inputs are scalars or 1d arrays broadcast against each other, so a whole option chain with
+        many strikes and expiries is priced at once. American options are rolled back in place on a
+        single array of steps + 1 node values per option, the chain in chunks of chunk_size options, and
+        every step only updates the nodes reached from the root with a probability above 1e-21.
+        European options and American calls without net benefits, which are never exercised early, are
+        valued as the binomially weighted sum of the terminal payoffs, which equals the backward induction.
+
+        ...
+
+        Attributes
+        ----------
+        s_0 : float
+            spot price of the underlying
+        x : float
+            exercise (strike) price
+        T : float
+            time to expiration in years
+        r_c : float
+            continuous risk-free rate in percentage
+        sigma : float
+            volatility of the underlying in percentage (u = exp(sigma * sqrt(T / steps)), d = 1 / u)
+        u : float
+            up factor per step, replaces sigma if given together with d
+        d : float
+            down factor per step
+        gamma_c : float
+            continuous benefits (dividend yield) in percentage
+        theta_c : float
+            continuous costs in percentage
+        option : string
+            'call' or 'put'
+        exercise : string
+            'european' or 'american'
+        steps : int
+            number of time steps of the lattice (default 100)
+        chunk_size : int
+            number of options rolled back together (default 256)
+        pi : float
+            risk-neutral probability of an up move
+        v_0 : float
+            value of the option at initialization, NaN for options whose lattice admits arbitrage
+            (pi outside of 0 and 1)
+
+        Methods
+        -------
+        price():
+            calculates pi and v_0 of all options
+        min_sigma(T, r_c, gamma_c=0, theta_c=0, steps=100):
+            lowest volatility of an arbitrage-free lattice
+
+
+        """
+
+    def __init__(self, **kwargs):
+        allowed_keys = {'s_0', 'x', 'T', 'r_c', 'sigma', 'u', 'd', 'gamma_c', 'theta_c', 'option',
+                        'exercise', 'steps', 'chunk_size', 'pi', 'v_0'}
+        self.__dict__.update(dict(zip(allowed_keys, [None] * len(allowed_keys))))
+        self.gamma_c, self.theta_c = 0, 0
+        self.option, self.exercise = 'call', 'european'
+        self.steps, self.chunk_size = 100, 256
+        self.__dict__.update((k, v) for k, v in kwargs.items() if k in allowed_keys)
+
+    @instrumented
+    def price(self):
+        n = int(self.steps)
+        if self.u is not None and self.d is not None:
+            u, d = self.u, self.d
+        elif self.sigma is not None:
+            u = np.exp(np.asarray(self.sigma, dtype=float) / 100 * np.sqrt(np.asarray(self.T, dtype=float) / n))
+            d = 1 / u
+        else:
+            raise ValueError('either sigma or u and d must be specified')
+        s_0, x, T, r_c, gamma_c, theta_c, u, d, is_call, is_american = np.broadcast_arrays(
+            *[np.atleast_1d(np.asarray(v, dtype=float)) for v in
+              (self.s_0, self.x, self.T, self.r_c, self.gamma_c, self.theta_c, u, d)],
+            np.atleast_1d(np.asarray(self.option) == 'call'), np.atleast_1d(np.asarray(self.exercise) == 'american'))
+        carry = gamma_c - theta_c
+        is_american = is_american & ~(is_call & (carry <= 0))
+        dt = T / n
+        pi = (np.exp((r_c - carry) / 100 * dt) - d) / (u - d)
+        # a lattice that admits arbitrage has no price, the other options of the chain are still priced
+        valid = (pi > 0) & (pi < 1)
+        if not np.all(valid):
+            logger.warning('lattice admits arbitrage for options %s, the up probability must lie between 0 and 1',
+                           np.flatnonzero(~valid).tolist())
+        disc = np.exp(-r_c / 100 * dt)
+        v_0 = np.full(len(s_0), np.nan)
+        # American chunks hold the node values as (steps + 1) x chunk_size blocks with the options of a node
+        # side by side, every step updates one contiguous block of rows in place, and the exercise values
+        # (2 * steps + 1) x chunk_size, together about 4 * steps * chunk_size * 8 bytes per chunk
+        for start in range(0, len(s_0), self.chunk_size):
+            chunk = slice(start, start + self.chunk_size)
+            args = (n, s_0[chunk], x[chunk], u[chunk], d[chunk], pi[chunk], disc[chunk], is_call[chunk])
+            american, european = valid[chunk] & is_american[chunk], valid[chunk] & ~is_american[chunk]
+            v_0[chunk][european] = _lattice_european(*[a[european] if np.ndim(a) else a for a in args])
+            v_0[chunk][american] = _lattice_american(*[a[american] if np.ndim(a) else a for a in args])
+        self.pi, self.v_0 = pi, v_0
+
+    @classmethod
+    @instrumented
+    def min_sigma(cls, T, r_c, gamma_c=0, theta_c=0, steps=100, **kwargs):
+        """
+            Lowest volatility of an arbitrage-free lattice, 0 < pi < 1 holds for
+            sigma > abs(r_c - gamma_c + theta_c) * sqrt(T / steps).
+
+            Parameters:
+                T, r_c, gamma_c, theta_c, steps : inputs of the options as in price(), other keywords are ignored
+            Returns:
+                array - volatility in percentage per option
+        """
+        carry = np.asarray(gamma_c, dtype=float) - np.asarray(theta_c, dtype=float)
+        return np.abs(np.asarray(r_c, dtype=float) - carry) * np.sqrt(np.asarray(T, dtype=float) / int(steps))
+
+
+def _lattice_terminal(n, s_0, x, u, d, is_call):
+    # payoff at the n + 1 terminal nodes, node i has i up moves
+    i = np.arange(n + 1)
+    s_n = s_0[:, None] * u[:, None] ** i * d[:, None] ** (n - i)
+    sign = np.where(is_call, 1.0, -1.0)[:, None]
+    return np.maximum(sign * (s_n - x[:, None]), 0)
+
+
+def _lattice_european(n, s_0, x, u, d, pi, disc, is_call):
+    # rolling a European payoff back is the binomially weighted sum of the terminal payoffs
+    i = np.arange(n + 1)
+    log_comb = np.concatenate(([0.0], np.cumsum(np.log((n - i[1:] + 1) / i[1:]))))
+    weights = np.exp(log_comb + i * np.log(pi)[:, None] + (n - i) * np.log1p(-pi)[:, None])
+    return disc ** n * np.einsum('ij,ij->i', weights, _lattice_terminal(n, s_0, x, u, d, is_call))
+
+
+def _lattice_american(n, s_0, x, u, d, pi, disc, is_call):
+    # backward induction in place, one column per option, at step j rows lo..hi of 0..j hold the node values
+    sign = np.where(is_call, 1.0, -1.0)
+    q_u, q_d = disc * pi, disc * (1 - pi)
+    lo, hi = _lattice_band(n, pi)
+    recombining = np.allclose(u * d, 1)
+    if recombining:
+        # node i at step j has the stock price s_0 * u ** (2 * i - j), precompute the exercise value once
+        exercise = sign * (s_0 * u ** np.arange(-n, n + 1)[:, None] - x)
+        values = np.maximum(exercise[::2], 0)
+    else:
+        stock = s_0 * u ** np.arange(n + 1)[:, None] * d ** np.arange(n, -1, -1)[:, None]
+        values = np.maximum(sign * (stock - x), 0)
+        exercise_j = np.empty_like(values)
+    up = np.empty_like(values)
+    for j in range(n - 1, -1, -1):
+        a, b = lo[j], hi[j] + 1
+        node, up_j = values[a:b], up[a:b]
+        np.multiply(values[a + 1:b + 1], q_u, out=up_j)
+        node *= q_d
+        node += up_j
+        if recombining:
+            np.maximum(node, exercise[n - j + 2 * a:n - j + 2 * b - 1:2], out=node)
+        else:
+            stock_j = stock[:j + 1]
+            stock_j /= d
+            np.subtract(stock_j[a:b], x, out=exercise_j[a:b])
+            exercise_j[a:b] *= sign
+            np.maximum(node, exercise_j[a:b], out=node)
+    return values[0].copy()
+
+
+def _lattice_band(n, pi):
+    # rows of every step reached from the root with a probability above 2 exp(-50) (Hoeffding), nodes outside
+    # keep the bounded values of a later step and change the root by less than that probability
+    j = np.arange(n + 1)
+    spread = 5 * np.sqrt(j)
+    lo = np.clip(np.floor(j * np.min(pi, initial=1) - spread), 0, None).astype(int)
+    hi = np.minimum(np.ceil(j * np.max(pi, initial=0) + spread), j).astype(int)
+    return lo, hi
+
+
+class BlackScholesMerton:
+    """
+        A class to represent European calls and puts priced in closed form with the Black-Scholes-Merton model.
+
+        All inputs are scalars or 1d arrays broadcast against each other. d1, d2, the discount factors and
+        the normal cdf and pdf are calculated once per option and shared by the price and all Greeks.
+
+        ...
+
+        Attributes
+        ----------
+        s_0 : float
+            spot price of the underlying
+        x : float
+            exercise (strike) price
+        T : float
+            time to expiration in years
+        r_c : float
+            continuous risk-free rate in percentage
+        sigma : float
+            volatility of the underlying in percentage
+        gamma_c : float
+            continuous benefits (dividend yield) in percentage
+        theta_c : float
+            continuous costs in percentage
+        option : string
+            'call' or 'put'
+        v_0 : float
+            value of the option at initialization
+        delta : float
+            change of v_0 per unit change of s_0
+        gamma : float
+            change of delta per unit change of s_0
+        vega : float
+            change of v_0 per percentage point change of sigma
+        theta : float
+            change of v_0 per year passing
+        rho : float
+            change of v_0 per percentage point change of r_c
+
+        Methods
+        -------
+        price():
+            calculates v_0 and the Greeks of all options
+
+
+        """
+
+    def __init__(self, **kwargs):
+        allowed_keys = {'s_0', 'x', 'T', 'r_c', 'sigma', 'gamma_c', 'theta_c', 'option',
+                        'v_0', 'delta', 'gamma', 'vega', 'theta', 'rho'}
+        self.__dict__.update(dict(zip(allowed_keys, [None] * len(allowed_keys))))
+        self.gamma_c, self.theta_c = 0, 0
+        self.option = 'call'
+        self.__dict__.update((k, v) for k, v in kwargs.items() if k in allowed_keys)
+
+    @instrumented
+    def price(self):
+        s_0, x, T, r_c, gamma_c, theta_c, sigma, sign = np.broadcast_arrays(
+            *[np.atleast_1d(np.asarray(v, dtype=float)) for v in
+              (self.s_0, self.x, self.T, self.r_c, self.gamma_c, self.theta_c, self.sigma)],
+            np.where(np.atleast_1d(np.asarray(self.option)) == 'call', 1.0, -1.0))
+        r, q, sigma = r_c / 100, (gamma_c - theta_c) / 100, sigma / 100
+        sigma_t = sigma * np.sqrt(T)
+        d1 = (np.log(s_0 / x) + (r - q + sigma ** 2 / 2) * T) / sigma_t
+        d2 = d1 - sigma_t
+        s_disc = s_0 * np.exp(-q * T)
+        x_disc = x * np.exp(-r * T)
+        n_d1 = _norm_cdf(sign * d1)
+        n_d2 = _norm_cdf(sign * d2)
+        pdf_d1 = _norm_pdf(d1)
+        self.v_0 = sign * (s_disc * n_d1 - x_disc * n_d2)
+        self.delta = sign * s_disc / s_0 * n_d1
+        self.gamma = s_disc * pdf_d1 / (s_0 ** 2 * sigma_t)
+        self.vega = s_disc * pdf_d1 * np.sqrt(T) / 100
+        self.theta = -s_disc * pdf_d1 * sigma / (2 * np.sqrt(T)) + sign * (q * s_disc * n_d1 - r * x_disc * n_d2)
+        self.rho = sign * x_disc * T * n_d2 / 100
+
+
+def _norm_pdf(z):
+    return np.exp(-z ** 2 / 2) / np.sqrt(2 * np.pi)
+
+
+def _norm_cdf(z):
+    # 0.5 * erfc(-z / sqrt(2)) with the Chebyshev fit of erfc, relative error below 1.2e-7
+    a = np.abs(z) / np.sqrt(2)
+    t = 1 / (1 + a / 2)
+    erfc = t * np.exp(-a * a - 1.26551223 + t * (1.00002368 + t * (0.37409196 + t * (0.09678418 + t * (
+        -0.18628806 + t * (0.27886807 + t * (-1.13520398 + t * (1.48851587 + t * (
+            -0.82215223 + t * 0.17087277)))))))))
+    return np.where(z >= 0, 1 - erfc / 2, erfc / 2)
+
+
+class MonteCarloOption:
+    """
+        A class to represent path-dependent calls and puts priced by Monte Carlo simulation of the underlying.
+
+        Paths are simulated in chunks of chunk_size and every chunk is folded into running estimators of
+        the mean and (co)variance, so memory does not grow with n_paths. Chunks run on a process pool of
+        workers processes, each chunk with its own random stream spawned from seed, so the result does
+        not depend on the number of workers.
+
+        ...
+
+        Attributes
+        ----------
+        s_0 : float
+            spot price of the underlying
+        x : float
+            exercise (strike) price
+        T : float
+            time to expiration in years
+        r_c : float
+            continuous risk-free rate in percentage
+        sigma : float
+            volatility of the underlying in percentage
+        gamma_c : float
+            continuous benefits (dividend yield) in percentage
+        theta_c : float
+            continuous costs in percentage
+        option : string
+            'call' or 'put'
+        payoff : string
+            'european', 'asian' (arithmetic average of the monitored prices), 'barrier' or
+            'lookback' (maximum resp. minimum of the monitored prices against x)
+        barrier : float
+            barrier level of a barrier option
+        barrier_type : string
+            'up-and-out', 'down-and-out', 'up-and-in' or 'down-and-in'
+        steps : int
+            number of monitoring dates (default 252)
+        n_paths : int
+            number of simulated paths (default 100000)
+        chunk_size : int
+            number of paths simulated at once (default 10000)
+        antithetic : bool
+            simulate every normal draw z together with -z
+        control_variate : bool
+            use the discounted terminal spot price, whose expectation is the discounted forward price
+            of :obj:`EquityForward`, as control variate
+        seed : int
+            seed of the random streams
+        workers : int
+            number of processes, None or 1 simulates in the calling process
+        v_0 : float
+            value of the option at initialization
+        se : float
+            standard error of v_0
+
+        Methods
+        -------
+        price():
+            calculates v_0 and se
+
+
+        """
+
+    def __init__(self, **kwargs):
+        allowed_keys = {'s_0', 'x', 'T', 'r_c', 'sigma', 'gamma_c', 'theta_c', 'option', 'payoff', 'barrier',
+                        'barrier_type', 'steps', 'n_paths', 'chunk_size', 'antithetic', 'control_variate',
+                        'seed', 'workers', 'v_0', 'se'}
+        self.__dict__.update(dict(zip(allowed_keys, [None] * len(allowed_keys))))
+        self.gamma_c, self.theta_c = 0, 0
+        self.option, self.payoff = 'call', 'european'
+        self.steps, self.n_paths, self.chunk_size = 252, 100000, 10000
+        self.antithetic, self.control_variate = False, False
+        self.__dict__.update((k, v) for k, v in kwargs.items() if k in allowed_keys)
+
+    @instrumented
+    def price(self):
+        if self.payoff == 'barrier' and (self.barrier is None or self.barrier_type not in
+                                         ('up-and-out', 'down-and-out', 'up-and-in', 'down-and-in')):
+            raise ValueError('barrier options need a barrier and a valid barrier_type')
+        # antithetic chunks hold pairs of paths
+        chunk_size = max(2, self.chunk_size - self.chunk_size % 2) if self.antithetic else self.chunk_size
+        n_paths = self.n_paths + self.n_paths % 2 if self.antithetic else self.n_paths
+        sizes = [chunk_size] * (n_paths // chunk_size) + ([n_paths % chunk_size] if n_paths % chunk_size else [])
+        seeds = np.random.SeedSequence(self.seed).spawn(len(sizes))
+        contract = {k: getattr(self, k) for k in ('s_0', 'x', 'T', 'r_c', 'sigma', 'gamma_c', 'theta_c', 'option',
+                                                  'payoff', 'barrier', 'barrier_type', 'steps', 'antithetic')}
+        tasks = [dict(contract, seed=seed, n_paths=size) for seed, size in zip(seeds, sizes)]
+        moments = np.zeros(6)
+        if self.workers is None or self.workers <= 1:
+            for task in tasks:
+                moments = _merge_moments(moments, _monte_carlo_chunk(task))
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                for chunk_moments in pool.map(_monte_carlo_chunk, tasks):
+                    moments = _merge_moments(moments, chunk_moments)
+        n, mean_y, mean_x, m_yy, m_xx, m_xy = moments
+        var_y = m_yy / (n - 1)
+        if self.control_variate:
+            forward = EquityForward(s_0=self.s_0, t_0_exp=self.T * 360, r_c=self.r_c, gamma_c=self.gamma_c,
+                                    theta_c=self.theta_c)
+            forward.f0()
+            b = m_xy / m_xx
+            self.v_0 = mean_y - b * (mean_x - forward.f_0 * np.exp(-self.r_c / 100 * self.T))
+            var_y = (m_yy - b * m_xy) / (n - 2)
+        else:
+            self.v_0 = mean_y
+        self.se = np.sqrt(var_y / n)
+
+
+def _monte_carlo_chunk(task):
+    # simulate one chunk of paths and return its count, means and centered (co)moments
+    n_paths, steps = task['n_paths'], task['steps']
+    rng = np.random.default_rng(task['seed'])
+    dt = task['T'] / steps
+    paths = rng.standard_normal((n_paths // 2 if task['antithetic'] else n_paths, steps))
+    if task['antithetic']:
+        paths = np.concatenate((paths, -paths))
+    paths *= task['sigma'] / 100 * np.sqrt(dt)
+    paths += ((task['r_c'] + task['theta_c'] - task['gamma_c']) / 100 - (task['sigma'] / 100) ** 2 / 2) * dt
+    np.cumsum(paths, axis=1, out=paths)
+    np.exp(paths, out=paths)
+    paths *= task['s_0']
+    sign = 1.0 if task['option'] == 'call' else -1.0
+    if task['payoff'] == 'asian':
+        payoff = np.maximum(sign * (paths.mean(axis=1) - task['x']), 0)
+    elif task['payoff'] == 'lookback':
+        extreme = paths.max(axis=1) if sign > 0 else paths.min(axis=1)
+        payoff = np.maximum(sign * (extreme - task['x']), 0)
+    else:
+        payoff = np.maximum(sign * (paths[:, -1] - task['x']), 0)
+        if task['payoff'] == 'barrier':
+            if task['barrier_type'].startswith('up'):
+                hit = paths.max(axis=1) >= task['barrier']
+            else:
+                hit = paths.min(axis=1) <= task['barrier']
+            payoff *= hit if task['barrier_type'].endswith('in') else ~hit
+    discount = np.exp(-task['r_c'] / 100 * task['T'])
+    y, x = payoff * discount, paths[:, -1] * discount
+    if task['antithetic']:
+        y, x = (y[:len(y) // 2] + y[len(y) // 2:]) / 2, (x[:len(x) // 2] + x[len(x) // 2:]) / 2
+    dy, dx = y - y.mean(), x - x.mean()
+    return np.array([len(y), y.mean(), x.mean(), dy @ dy, dx @ dx, dx @ dy])
+
+
+def _merge_moments(a, b):
+    # pairwise update of count, means and centered (co)moments
+    n = a[0] + b[0]
+    if a[0] == 0 or b[0] == 0:
+        return a + b if n == 0 else (a if b[0] == 0 else b)
+    delta_y, delta_x = b[1] - a[1], b[2] - a[2]
+    weight = a[0] * b[0] / n
+    return np.array([n, a[1] + delta_y * b[0] / n, a[2] + delta_x * b[0] / n,
+                     a[3] + b[3] + delta_y ** 2 * weight, a[4] + b[4] + delta_x ** 2 * weight,
+                     a[5] + b[5] + delta_x * delta_y * weight])
+
+
+class ImpliedVolatility:
+    """
+        A class to represent the implied volatilities of a whole option chain.
+
+        The volatilities of all options are solved together by safeguarded Newton iterations on the
+        pricer: the volatility stays inside a bracket that shrinks with every evaluation and a step
+        leaving the bracket is replaced by bisection. Pricers without vega, such as
+        :obj:`BinomialOption`, take secant steps instead. Options that converged or failed are dropped
+        from the iterations, so only the remaining ones are priced again.
+
+        ...
+
+        Attributes
+        ----------
+        v_0 : float
+            market prices of the options
+        pricer : class
+            :obj:`BlackScholesMerton` (default) or :obj:`BinomialOption`
+        s_0, x, T, r_c, gamma_c, theta_c, option, exercise :
+            inputs of the pricer, scalars or 1d arrays broadcast against v_0, any other keyword such
+            as steps is passed on to the pricer unchanged
+        sigma_low : float
+            lower end of the volatility bracket in percentage (default 0.01), raised per option to the
+            lowest volatility of an arbitrage-free lattice for pricers with min_sigma such as
+            :obj:`BinomialOption`
+        sigma_high : float
+            upper end of the volatility bracket in percentage (default 500)
+        tol : float
+            absolute price tolerance (default 1e-8)
+        max_iter : int
+            maximum number of iterations (default 100)
+        sigma : float
+            implied volatility in percentage, NaN where no volatility in the bracket matches v_0
+        iterations : int
+            number of pricer evaluations per option
+        converged : bool
+            True for options whose price was matched within tol
+
+        Methods
+        -------
+        calc():
+            calculates sigma, iterations and converged of all options
+
+
+        """
+
+    contract_keys = ('s_0', 'x', 'T', 'r_c', 'gamma_c', 'theta_c', 'option', 'exercise')
+
+    def __init__(self, **kwargs):
+        allowed_keys = {'v_0', 'pricer', 'sigma_low', 'sigma_high', 'tol', 'max_iter', 'sigma', 'iterations',
+                        'converged'}
+        self.__dict__.update(dict(zip(allowed_keys, [None] * len(allowed_keys))))
+        self.pricer = BlackScholesMerton
+        self.sigma_low, self.sigma_high, self.tol, self.max_iter = 0.01, 500, 1e-8, 100
+        self.__dict__.update((k, v) for k, v in kwargs.items() if k in allowed_keys)
+        self.contract = {k: v for k, v in kwargs.items() if k not in allowed_keys}
+
+    @instrumented
+    def calc(self):
+        per_option = {k: v for k, v in self.contract.items() if k in self.contract_keys}
+        arrays = np.broadcast_arrays(np.atleast_1d(np.asarray(self.v_0, dtype=float)),
+                                     *[np.atleast_1d(np.asarray(v)) for v in per_option.values()])
+        target, per_option = arrays[0], dict(zip(per_option, arrays[1:]))
+        settings = {k: v for k, v in self.contract.items() if k not in self.contract_keys}
+        n = len(target)
+
+        def evaluate(index, sigma):
+            pricer = self.pricer(sigma=sigma, **{k: v[index] for k, v in per_option.items()}, **settings)
+            pricer.price()
+            return pricer.v_0 - target[index], getattr(pricer, 'vega', None)
+
+        low, high = np.full(n, float(self.sigma_low)), np.full(n, float(self.sigma_high))
+        if hasattr(self.pricer, 'min_sigma'):
+            # lattices below the minimum volatility admit arbitrage and have no price
+            floor = self.pricer.min_sigma(**per_option, **settings) * (1 + 1e-9)
+            low = np.maximum(low, np.broadcast_to(floor, (n,)))
+        every = np.arange(n)
+        diff_low, _ = evaluate(every, low)
+        diff_high, _ = evaluate(every, high)
+        self.iterations = np.full(n, 2)
+        self.converged = np.zeros(n, dtype=bool)
+        self.sigma = np.full(n, np.nan)
+        # prices outside the range of the bracket have no implied volatility
+        active = every[(low < high) & (diff_low <= 0) & (diff_high >= 0)]
+        # secant start between the bracket ends, Newton steps start in the middle of the bracket
+        prev_sigma, prev_diff = high[active], diff_high[active]
+        sigma = low[active] - diff_low[active] * (high[active] - low[active]) / (diff_high[active] - diff_low[active])
+        for _ in range(self.max_iter):
+            if len(active) == 0:
+                break
+            diff, vega = evaluate(active, sigma)
+            self.iterations[active] += 1
+            done = np.abs(diff) < self.tol
+            self.sigma[active[done]] = sigma[done]
+            self.converged[active[done]] = True
+            low[active] = np.where(diff < 0, sigma, low[active])
+            high[active] = np.where(diff > 0, sigma, high[active])
+            with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+                if vega is not None:
+                    candidate = sigma - diff / vega
+                else:
+                    candidate = sigma - diff * (sigma - prev_sigma) / (diff - prev_diff)
+            lo, hi = low[active], high[active]
+            inside = np.isfinite(candidate) & (candidate > lo) & (candidate < hi)
+            prev_sigma, prev_diff = sigma, diff
+            sigma = np.where(inside, candidate, (lo + hi) / 2)
+            keep = ~done
+            active, sigma, prev_sigma, prev_diff = active[keep], sigma[keep], prev_sigma[keep], prev_diff[keep]
@@ -5,12 +5,17 @@
 
 from datetime import datetime, date
 import json
+import logging
 from random import randint
 
 import pandas as pd
 import numpy as np
 from datetime import datetime, date
 
+from src.instrumentation import instrumented
+
+logger = logging.getLogger(__name__)
+
 
 class FinancialAssets:
     """
@@ -58,6 +63,7 @@ class FinancialAssets:
         if not hasattr(self, 'value_t'):
             self.value_t = 0
 
+    @instrumented
     def f0(self):
 
         if hasattr(self, 'r_c'):
@@ -76,6 +82,7 @@ class FinancialAssets:
                 theta_0 = theta_0 + thet / (1 + self.r / 100) ** (t / 360)
             self.f_0 = (self.s_0 + theta_0 - gamma_0) * (1 + self.r / 100) ** ((self.t_0_exp) / 360)
 
+    @instrumented
     def value(self):
         # calculate f_t and value of contract if 't' is in the inputs
         if hasattr(self, 't') and hasattr(self, 's_t'):
@@ -106,18 +113,19 @@ class Associates:
                     self.dividends = kwargs['data'][column]
                 elif column == 'income':
                     self.income = kwargs['data'][column]
-            print(self.dividends)
+            logger.debug('dividends: %s', self.dividends)
 
+    @instrumented
     def value(self, **kwargs):
         if 'date' in kwargs:
             date_value = kwargs['date']
         else:
             date_value = self.income.index[-1]
 
-        print(date_value)
+        logger.debug('date: %s', date_value)
         if len(self.interest.index) == 1:
             day_of_year = self.interest.index[0].timetuple().tm_yday
-            print("Day of year: ", day_of_year, "\n")
+            logger.debug('Day of year: %s', day_of_year)
             year_fac = (365 - (day_of_year - 1)) / 365
             # print(year_fac)
             # print(type(self.interest.index[0].year))
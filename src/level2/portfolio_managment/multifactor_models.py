@@ -5,15 +5,19 @@
 
 from datetime import datetime, date
 import json
+import logging
 from random import randint
 
 import pandas as pd
 import numpy as np
-from itertools import combinations, chain
 import sympy as sym
 
 from datetime import datetime, date
 
+from src.instrumentation import instrumented
+
+logger = logging.getLogger(__name__)
+
 
 class MacroFacModels:
     """
@@ -47,6 +51,7 @@ class MacroFacModels:
         self.portfolio = df
         self.return_symbolic = None
 
+    @instrumented
     def return_sym(self):
         port_return = sym.Symbol('')
 
@@ -56,22 +61,13 @@ class MacroFacModels:
                 sym.nsimplify(str(row['weight']) + '*' + str(row['b_i2']) + '*F_GDP') + \
                 sym.nsimplify(str(row['weight']) + '*' + 'eps_' + str(row['Stock']))
         self.return_symbolic = port_return
-        print(type(port_return))
-        print(str(port_return))
+        logger.debug('portfolio return: %s', port_return)
 
+    @instrumented
     def return_value(self, **kwargs):
-        for kwar in kwargs:
-            print(type(kwar))
         free_sym = self.return_symbolic.free_symbols
         a = list(filter(None, free_sym))
-        print(a)
-        for free_symbol in a:
-            b = free_symbol
-            print(b)
-
-
-
-        print(list(free_sym)[0])
+        logger.debug('free symbols: %s', a)
         #print(self.return_symbolic.evalf(subs={F_INFL:0.01, F_GDP:0, eps_MANM:0.05, eps_NXT:0.05}))
 
 
@@ -80,47 +76,52 @@ class MacroFacModels:
 
 
 
-def check_arbitrage(data):
-    print(data)
-    # Get all combinations of two portfolios of dataframe
-    # and length 2
-    all_combs = combinations(range(len(data.iloc[:, 0])), 2)
-    comb_list = []
-    for i, value in enumerate(list(all_combs)):
-        comb_list = comb_list + [value]
-    # for j, value in enumerate(list(all_combs)):
-    del all_combs
-    # initialize zero
-    res = np.zeros((len(comb_list), 2))
-    # Print the obtained combinations
-    # comb_list = []
-    for i, value in enumerate(comb_list):
-        comb_list = comb_list + [value]
-        a = np.array([[1] * 2, list(data.iloc[list(value), 2])]).transpose()
-        b = np.array(list(data.iloc[list(value), 1]))
-        res[i, :] = np.linalg.solve(a, b)
-    res = np.round_(res, 10)
-    unique_rows, indices = np.unique(res, axis=0, return_index=True)
-    n_ind = 0
-    for row in unique_rows:
-        ind = np.where((res[:, 0] == row[0]) & (res[:, 1] == row[1]))
-        if len(ind[0]) > n_ind:
-            n_ind = len(ind[0])
-            indices = ind[0]
-    res_list = [comb_list[i] for i in indices]
-    res_list = list(chain.from_iterable(res_list))
-    res_list = list(set(res_list))
-    print('no arbitrage for Portfolio:', *data['Portfolio'][res_list], sep=', ')
-    print('Risk-free-rate:      ', res[indices[0], 0])
-    print('factor risk premium: ', res[indices[0], 1])
-    data_index_list = [i for i in range(len(data.index))]
-    main_list = np.setdiff1d(data_index_list, res_list)
-    print('arbitrage for Portfolio:', *data['Portfolio'][main_list], sep=', ')
-
-
-
-
-
-
-    return data['Portfolio'][0]
-
+@instrumented
+def check_arbitrage(data, tol=1e-10):
+    """
+        Splits portfolios into those priced consistently by a one factor APT model and arbitrage portfolios.
+
+        The consensus line E(R) = risk_free + premium * beta is the line through the most portfolios. Every
+        pair of portfolios defines a line in closed form, the lines through one anchor portfolio are counted
+        in one array operation, and anchors stop once the remaining ones cannot beat the best line found, so
+        the search is about linear in the number of portfolios when most of them lie on the consensus line.
+
+        Parameters:
+            data : :obj:`pandas.DataFrame` with the portfolio name, the expected return and the factor
+                   sensitivity in its first three columns
+            tol  : absolute tolerance of a return on the line
+        Returns:
+            dict - 'risk_free' and 'premium' of the consensus line, the rows of data without ('no_arbitrage')
+            and with ('arbitrage') a mispriced expected return and the 'alpha' of every portfolio
+    """
+    logger.debug('portfolios:\n%s', data)
+    expected = data.iloc[:, 1].to_numpy(dtype=float)
+    beta = data.iloc[:, 2].to_numpy(dtype=float)
+    n = len(expected)
+    decimals = max(int(-np.log10(tol)), 0)
+    best, risk_free, premium = 0, np.nan, np.nan
+    for i in range(n - 1):
+        if best >= n - i:
+            break
+        d_beta, d_expected = beta[i + 1:] - beta[i], expected[i + 1:] - expected[i]
+        same = d_beta == 0
+        # portfolios equal to the anchor lie on all of its lines, equal betas with other returns on none
+        duplicates = np.count_nonzero(same & (np.abs(d_expected) <= tol))
+        slope = d_expected[~same] / d_beta[~same]
+        if len(slope) == 0:
+            continue
+        lines = np.round(np.column_stack((expected[i] - slope * beta[i], slope)), decimals)
+        unique, first, counts = np.unique(lines, axis=0, return_index=True, return_counts=True)
+        k = np.argmax(counts)
+        if counts[k] + duplicates + 1 > best:
+            best = counts[k] + duplicates + 1
+            premium = slope[first[k]]
+            risk_free = expected[i] - premium * beta[i]
+    alpha = expected - risk_free - premium * beta
+    mispriced = ~(np.abs(alpha) <= tol)
+    logger.info('no arbitrage for Portfolio: %s', ', '.join(map(str, data.iloc[~mispriced, 0])))
+    logger.info('Risk-free-rate:       %s', risk_free)
+    logger.info('factor risk premium:  %s', premium)
+    logger.info('arbitrage for Portfolio: %s', ', '.join(map(str, data.iloc[mispriced, 0])))
+    return {'risk_free': risk_free, 'premium': premium, 'alpha': alpha,
+            'no_arbitrage': data[~mispriced], 'arbitrage': data[mispriced]}
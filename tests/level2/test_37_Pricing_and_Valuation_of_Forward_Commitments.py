@@ -1,6 +1,11 @@
 import unittest
 import src.level2.derivatives.forward_commitments as fc
 import pandas as pd
+import numpy as np
+import json
+import pickle
+import timeit
+from src import instrumentation
 
 
 # Testing CFA II 2020 Reading 37 :Pricing and Valuation of Forward Commitments on curriculum examples
@@ -35,6 +40,212 @@ class TestEquityForward(unittest.TestCase):
         self.assertAlmostEqual(equ.value_t, 9.236592, places=2, msg='Example 5 failed')
 
 
+class TestEquityForwardBatch(unittest.TestCase):
+    def test_from_arrays(self):
+        # Examples 1.1, 1.2, 3 and 5 priced as one book
+        kwargs = {'s_0': [63.31, 63.31, 3500, np.nan], 'f_0': [np.nan, np.nan, np.nan, 102],
+                  'r': [2.75, 2.25, np.nan, 5], 'r_c': [np.nan, np.nan, 0.15, np.nan],
+                  't_0_exp': [90, 90, 90, 360], 'gamma_c': [0, 0, 3, 0],
+                  't': [np.nan, np.nan, np.nan, 270], 's_t': [np.nan, np.nan, np.nan, 110]}
+        equ = fc.EquityForward.from_arrays(**kwargs)
+        np.testing.assert_almost_equal(equ.f_0, [63.74, 63.6632, 3475.15, 102], decimal=2)
+        self.assertAlmostEqual(equ.value_t[3], 9.236592, places=2, msg='Example 5 failed')
+        equ_df = fc.EquityForward.from_frame(pd.DataFrame(kwargs))
+        np.testing.assert_array_equal(equ_df.f_0, equ.f_0)
+        # scalar path
+        for i in range(2):
+            single = fc.EquityForward(s_0=kwargs['s_0'][i], t_0_exp=90, r=kwargs['r'][i])
+            single.f0()
+            self.assertAlmostEqual(equ.f_0[i], single.f_0, places=10)
+
+
+    def test_carry_schedule(self):
+        # Example 4 next to contracts without and with two dividends
+        gamma = fc.CarrySchedule.from_lists([[[2.20], [30]], [[], []], [[1, 2], [30, 120]]])
+        np.testing.assert_array_equal(gamma.offsets, [0, 1, 1, 3])
+        equ = fc.EquityForward.from_arrays(s_0=70, t_0_exp=[30, 30, 180], r=1, gamma=gamma)
+        self.assertAlmostEqual(equ.f_0[0], 67.86, places=2, msg='Example 4 failed')
+        self.assertAlmostEqual(equ.f_0[1], 70 * 1.01 ** (30 / 360), places=10)
+        single = fc.EquityForward(s_0=70, t_0_exp=180, r=1, gamma=[[1, 2], [30, 120]])
+        single.f0()
+        self.assertAlmostEqual(equ.f_0[2], single.f_0, places=10)
+
+
+    def test_scenario_values(self):
+        # Example 2 and 5 across two spot paths and two valuation days
+        equ = fc.EquityForward.from_arrays(f_0=[105, 102, 105], t_0_exp=360, r=5)
+        spot_paths = [[100, 110], [90, 120]]
+        chunks = list(equ.scenario_values(spot_paths, [180, 270], chunk_size=2))
+        self.assertEqual([(start, stop) for start, stop, _ in chunks], [(0, 2), (2, 3)])
+        cube = np.concatenate([values for _, _, values in chunks])
+        self.assertEqual(cube.shape, (3, 2, 2))
+        self.assertAlmostEqual(cube[0, 0, 1], 6.2729, places=2, msg='Example 2 failed')
+        self.assertAlmostEqual(cube[1, 0, 1], 9.236592, places=2, msg='Example 5 failed')
+        single = fc.EquityForward(f_0=102, t_0_exp=360, t=180, s_t=90, r=5)
+        single.value()
+        self.assertAlmostEqual(cube[1, 1, 0], single.value_t, places=10)
+
+
+class TestForwardBook(unittest.TestCase):
+    def test_book(self):
+        # Examples 1.1 and 3 as equity book
+        book = fc.ForwardBook.from_arrays('equity', s_0=[63.31, 3500], t_0_exp=90, r=[2.75, np.nan],
+                                          r_c=[np.nan, 0.15], gamma_c=[0, 3])
+        book.price()
+        np.testing.assert_almost_equal(book['f_0'], [63.74, 3475.15], decimal=2)
+        row = book[-1]
+        self.assertAlmostEqual(row.f_0, 3475.15, places=2, msg='Example 3 failed')
+        row.s_0 = 3600
+        self.assertEqual(book['s_0'][1], 3600)
+        with self.assertRaises(AttributeError):
+            row.f_0_wrong = 1
+        # Examples 6.2 and 8 as FRA book
+        book = fc.ForwardBook.from_arrays('fra', NA=10000000, h=[30, 180], m=90, g=[np.nan, 90], L_h=0.55,
+                                          D_h=[0.4, 1.35], FRA_0=[0.6, 0.86], FRA_g=[np.nan, 1.4454828660436014])
+        book.price()
+        self.assertAlmostEqual(book['pay_set'][0], 1248.75, places=2, msg='Example 6.2 failed')
+        self.assertAlmostEqual(book['value_g'][1], 14651, msg='Example 8 failed', delta=14651 * 0.01)
+        # Examples 9 and 11.1
+        book = fc.ForwardBook.from_arrays('fixed_income', B_0=108, AI_0=0.083, AI_T=0.25, FVCI=0,
+                                          CF=0.729535, r=0.1, T=1 / 12)
+        book.price()
+        self.assertAlmostEqual(book[0].QF_0, 147.82, places=2, msg='Example 9 failed')
+        book = fc.ForwardBook.from_arrays('currency', S_0=0.792, r_d=0.3, r_f=1, T_0=1)
+        book.price()
+        self.assertAlmostEqual(book[0].F_0, 0.798, msg='Example 11.1 failed', delta=0.798 * 0.01)
+        memory = book.memory_comparison()
+        self.assertLess(memory['book_bytes_per_row'], memory['object_bytes_per_row'])
+
+
+class TestDiscountCurve(unittest.TestCase):
+    def test_curve(self):
+        curve = fc.DiscountCurve(maxsize=3)
+        # Example 1.1 twice against the same curve
+        for _ in range(2):
+            equ = fc.EquityForward(s_0=63.31, t_0_exp=90, r=2.75, curve=curve)
+            equ.f0()
+            self.assertAlmostEqual(equ.f_0, 63.74, places=2, msg='Example 1.1 failed')
+        self.assertEqual(curve.cache_info()['hits'], 4)
+        # Example 7 with simple interest
+        fra = fc.FRA(curve=curve)
+        fra.fra([[0, 180, 90], [1.5, 1.75]])
+        self.assertAlmostEqual(fra.FRA_0, 2.23, places=2, msg='Example 7 failed')
+        self.assertEqual(curve.cache_info()['currsize'], 3)
+        # vectors of factors are one lookup each, NaN entries included
+        for _ in range(2):
+            factors = curve.factor([2.75, 1, 2.75, np.nan], [90, 30, 90, 90])
+        np.testing.assert_allclose(factors[:3], (1 + np.array([2.75, 1, 2.75]) / 100) ** (np.array([90, 30, 90]) / 360))
+        self.assertTrue(np.isnan(factors[3]))
+        self.assertEqual((curve.hits, curve.misses), (5, 5))
+        # scalar NaN keys are not cached
+        self.assertTrue(np.isnan(curve.factor(np.nan, 90)))
+        self.assertEqual(curve.cache_info()['currsize'], 3)
+        # a warm lookup of a large snapshot is no slower than calculating it
+        r, t = np.random.default_rng(0).uniform(0, 5, 200000), np.arange(200000) % 3600
+        curve.factor(r, t)
+        cached = min(timeit.repeat(lambda: curve.factor(r, t), number=5, repeat=5))
+        direct = min(timeit.repeat(lambda: (1 + r / 100) ** (t / 360), number=5, repeat=5))
+        self.assertLess(cached, direct)
+        np.testing.assert_allclose(curve.factor(r, t), (1 + r / 100) ** (t / 360))
+
+
+class TestYieldCurve(unittest.TestCase):
+    def test_bootstrap(self):
+        for interpolation in ('log_linear', 'linear_zero', 'monotone_cubic'):
+            yc = fc.YieldCurve.bootstrap(deposits=[[30, 90, 180], [1.0, 1.1, 1.25]], fras=[[180, 270], [90, 90], [1.5, 1.6]],
+                                         swaps=[[720, 1800], [1.8, 2.3]], interpolation=interpolation)
+            # the curve reprices every instrument
+            np.testing.assert_allclose(yc.libor([30, 90, 180]), [1.0, 1.1, 1.25])
+            np.testing.assert_allclose(yc.fra([180, 270], [90, 90]), [1.5, 1.6])
+            self.assertAlmostEqual(fc.fixed_rate(yc, dates=[360, 720]) * 100, 1.8)
+            self.assertAlmostEqual(fc.InterestRateSwap.par_rates(yc, dates=np.arange(360, 1801, 360))[-1] * 100, 2.3)
+            self.assertEqual(yc.pv(0), 1)
+            self.assertTrue(np.all(np.diff(yc.pv(np.arange(0, 2000, 10))) < 0))
+        # immutable, hashable and picklable
+        self.assertEqual(hash(pickle.loads(pickle.dumps(yc))), hash(yc))
+        self.assertEqual(pickle.loads(pickle.dumps(yc)), yc)
+        with self.assertRaises(AttributeError):
+            yc.ntd = 365
+        with self.assertRaises(ValueError):
+            yc.days[0] = 1
+
+    def test_pricers(self):
+        yc = fc.YieldCurve.bootstrap(deposits=[[90, 180, 270, 360], [2.5, 2.6, 2.7, 2.8]])
+        # the FRA strip and book read the curve directly
+        strip = fc.FRA.strip(None, pv=yc, h=[90, 180], m=[90])
+        np.testing.assert_allclose(strip.to_numpy()[:, 0], yc.fra([90, 180], 90))
+        values = fc.FRA.revalue_book([1e6], [2.8], [180], [90], [0, 90], None, [yc, yc])
+        self.assertAlmostEqual(values[0, 0], 1e6 * (yc.fra(180, 90) - 2.8) / 100 / 4 * yc.pv(270))
+        # currency swaps read the present value factors at NAD
+        spot_rates = {'NAD': [90, 180, 270, 360], 'AUD': [2.50, 2.60, 2.70, 2.80], 'USD': [0.10, 0.15, 0.20, 0.25]}
+        cs = fc.CurrencySwap(na={'AUD': 1e8, 'USD': None}, curr_pair={'DC': 'USD', 'FC': 'AUD'}, spot_rates=spot_rates,
+                             exchange_rate={'AUD/USD': 1.140})
+        usd = fc.YieldCurve.bootstrap(deposits=[spot_rates['NAD'], spot_rates['USD']])
+        pv = {'NAD': [90, 180, 270, 360], 'AUD': yc, 'USD': usd}
+        curves = fc.CurrencySwap(na={'AUD': 1e8, 'USD': None}, curr_pair={'DC': 'USD', 'FC': 'AUD'}, pv=pv,
+                                 exchange_rate={'AUD/USD': 1.140})
+        self.assertAlmostEqual(curves.r_fix['AUD'], cs.r_fix['AUD'])
+        self.assertAlmostEqual(curves.r_fix['USD'], cs.r_fix['USD'])
+
+
+class TestInstrumentation(unittest.TestCase):
+    def test_instrumentation(self):
+        instrumentation.reset()
+        instrumentation.enable()
+        try:
+            for _ in range(2):
+                equ = fc.EquityForward(s_0=63.31, t_0_exp=90, r=2.75)
+                equ.f0()
+        finally:
+            instrumentation.disable()
+        equ.f0()
+        stats = json.loads(instrumentation.to_json())
+        self.assertEqual(stats['forward_commitments.EquityForward.f0']['calls'], 2)
+        self.assertGreater(stats['forward_commitments.EquityForward.f0']['time'], 0)
+        instrumentation.reset()
+        self.assertEqual(instrumentation.stats(), {})
+        # messages go to the module logger instead of stdout
+        with self.assertLogs('src.level2.derivatives.forward_commitments', level='INFO') as logs:
+            fc.CurrencySwap(na={'AUD': 1e8, 'USD': None}, curr_pair={'DC': 'USD', 'FC': 'AUD'},
+                            spot_rates={'NAD': [90, 180], 'AUD': [2.5, 2.6], 'USD': [0.1, 0.15]},
+                            exchange_rate={'AUD/USD': 1.140})
+        self.assertIn('No fixed rates specified', logs.output[0])
+
+
+class TestRelations(unittest.TestCase):
+    def test_solve(self):
+        # implied dividend yield and break-even spot of equity forwards
+        gamma_c, converged = fc.solve('equity_forward', s_0=[100, 50], f_0=[101, 52], r_c=3, gamma_c=None,
+                                      t_0_exp=[180, 360])
+        self.assertTrue(converged.all())
+        np.testing.assert_allclose(gamma_c, [3 - 200 * np.log(1.01), 3 - 100 * np.log(1.04)])
+        equ = fc.EquityForward(s_0=None, f_0=101, r=3, t_0_exp=180, gamma=[[1], [90]])
+        equ.solve()
+        check = fc.EquityForward(s_0=equ.s_0, r=3, t_0_exp=180, gamma=[[1], [90]])
+        check.f0()
+        self.assertAlmostEqual(check.f_0, 101)
+        # the implied repo rate discounts the dividends at the rate itself
+        equ = fc.EquityForward(s_0=100, f_0=101, t_0_exp=180, gamma=[[2], [90]])
+        equ.solve()
+        self.assertIsNone(equ.r_c)
+        check = fc.EquityForward(s_0=100, r=equ.r, t_0_exp=180, gamma=[[2], [90]])
+        check.f0()
+        self.assertAlmostEqual(check.f_0, 101)
+        self.assertTrue(equ.r > 6)
+        # implied repo of a bond future
+        fif = fc.FixedIncomeForward(B_0=100, AI_0=1, AI_T=0.5, FVCI=1.5, CF=1, QF_0=101.5, T=0.25)
+        fif.solve()
+        self.assertAlmostEqual(fif.r, ((103.5 / 101) ** 4 - 1) * 100)
+        # FRA rate and the inputs of covered interest rate parity
+        fra, _ = fc.solve('fra', L_near=1, L_far=1.5, h=90, m=90)
+        self.assertAlmostEqual(fra[0], (1.0075 / 1.0025 - 1) * 400)
+        T_0, converged = fc.solve('currency_forward', S_0=0.792, F_0=[0.791, 0.8], r_d=1, r_f=0.3)
+        np.testing.assert_array_equal(converged, [True, False])
+        self.assertAlmostEqual(T_0[0], np.log(0.791 / 0.792) / np.log(1.003 / 1.01))
+        with self.assertRaises(ValueError):
+            fc.solve('fra', L_near=1, h=90, m=90)
+
+
 class TestFRA(unittest.TestCase):
     def test_fra(self):
         # Example 6.1
@@ -60,6 +271,35 @@ class TestFRA(unittest.TestCase):
         self.assertAlmostEqual(fra.value_g, 14651, msg='Example 8 failed', delta=14651*0.01)
 
 
+    def test_strip(self):
+        # Example 7 inside a strip of 30 to 360 days x 90 and 180 days
+        days = [30, 90, 180, 270, 360, 540]
+        libor = [1.2, 1.35, 1.5, 1.75, 1.9, 2.1]
+        strip = fc.FRA.strip(days, libor=libor, m=[90, 180])
+        self.assertEqual(strip.shape, (12, 2))
+        self.assertAlmostEqual(strip.loc[180, 90], 2.23, places=2, msg='Example 7 failed')
+        fra = fc.FRA()
+        fra.fra([[0, 90, 180], [1.35, 1.75]])
+        self.assertAlmostEqual(strip.loc[90, 180], fra.FRA_0, places=10)
+        pv = 1 / (1 + np.array(libor) / 100 * np.array(days) / 360)
+        pd.testing.assert_frame_equal(fc.FRA.strip(days, pv=pv, m=[90, 180]), strip)
+
+
+    def test_revalue_book(self):
+        # Example 8 as second FRA of a book valued on three days
+        days = [60, 90, 180, 270]
+        libor = [[0.5, 0.628, 0.712, 0.8], [1.2, 1.25, 1.35, 1.4], [1.3, 1.35, 1.45, 1.5]]
+        values = fc.FRA.revalue_book(NA=[5e6, 1e7], FRA_0=[0.7, 0.86], h=[60, 180], m=90, g=[0, 90, 120],
+                                     days=days, libor=libor)
+        self.assertEqual(values.shape, (2, 3))
+        self.assertAlmostEqual(values[1, 1], 14651, msg='Example 8 failed', delta=14651 * 0.01)
+        self.assertTrue(np.isnan(values[0, 1]))
+        fra = fc.FRA()
+        fra.fra([[90, 180, 90], [1.25, 1.35]])
+        fra.value(FRA_0=0.86, NA=10000000, g=90, h=180, m=90, D_h=1.35)
+        self.assertAlmostEqual(values[1, 1], fra.value_g, places=6)
+
+
 class TestFixedIncome(unittest.TestCase):
     def test_fif(self):
         # Example 9
@@ -73,6 +313,50 @@ class TestFixedIncome(unittest.TestCase):
         self.assertAlmostEqual(fif.V_t/100*fif.contract_value*fif.n_contracts, 14998.50,
                                msg='Example 10 failed', delta=14998.50*0.01)
 
+    def test_carry(self):
+        fif = fc.FixedIncomeForward(NAD=30, NTD=180, n=2, C=5, r=3, T=0.5)
+        fif.carry()
+        # coupon of 2.5 after 150 days, accrued for 30 days at delivery
+        self.assertAlmostEqual(fif.AI_0, 2.5 / 6)
+        self.assertAlmostEqual(fif.AI_T, 2.5 / 6)
+        self.assertAlmostEqual(fif.FVCI, 2.5 * 1.03 ** (1 / 12))
+        self.assertAlmostEqual(fif.PVCI, fif.FVCI / 1.03 ** 0.5)
+        # bonds x tenors feed straight into f0
+        book = fc.FixedIncomeForward(NAD=[30, 150], NTD=[180, 182], n=2, C=[5, 4], r=3, T=[0.25, 0.5, 1])
+        book.carry()
+        book.f0(B_0=[100, 98], CF=[0.9, 0.85])
+        self.assertEqual(book.F_0.shape, (2, 3))
+        fif.f0(B_0=100, CF=0.9)
+        self.assertAlmostEqual(book.F_0[0, 1], fif.F_0)
+        self.assertAlmostEqual(book.QF_0[0, 1], fif.QF_0)
+        self.assertAlmostEqual(book.FVCI[0, 2], 2.5 * (1.03 ** (7 / 12) + 1.03 ** (1 / 12)))
+
+    def test_deliverable_basket(self):
+        basket = fc.DeliverableBasket(B_0=[104, 108, 99], C=[3, 4, 2], maturity=[9.2, 15.7, 7.4],
+                                      CF=[0.85, 0.94, 0.8], QF_0=[120, 119.5], T=[0.25, 0.5], r=3)
+        basket.calc()
+        np.testing.assert_allclose(basket.AI_0, [0.9, 1.2, 0.2])
+        np.testing.assert_allclose(basket.AI_T, [[0.15, 0.9], [0.2, 1.2], [0.7, 0.2]])
+        # each pair agrees with the single bond forward
+        fif = fc.FixedIncomeForward()
+        fif.f0(B_0=99, AI_0=0.2, AI_T=0.2, FVCI=basket.FVCI[2, 1], CF=0.8, r=3, T=0.5)
+        self.assertAlmostEqual(basket.F_0[2, 1], fif.F_0)
+        self.assertAlmostEqual(basket.FVCI[2, 1], 1 * 1.03 ** 0.1)
+        # the CTD bond has the highest implied repo and the lowest net basis
+        np.testing.assert_array_equal(basket.ctd, [1, 1])
+        np.testing.assert_array_equal(np.argmax(basket.implied_repo, axis=0), basket.ctd)
+        np.testing.assert_allclose(basket.gross_basis[:, 0], [2, -4.8, 3])
+        # F_0 is clean, so the accrued interest at delivery does not enter the net basis: bond 0 has the
+        # higher net basis although F_0 - (QF_0 * CF + AI_T) would pick it
+        basket = fc.DeliverableBasket(B_0=[109, 107], C=[6, 2], maturity=[6.5, 13.2], CF=[0.89, 0.89], QF_0=[120],
+                                      T=[0.25], r=3)
+        basket.calc()
+        np.testing.assert_allclose(basket.AI_T[:, 0], [1.5, 0.1])
+        np.testing.assert_allclose(basket.net_basis, basket.F_0 - 120 * 0.89)
+        self.assertTrue(basket.net_basis[0, 0] - basket.AI_T[0, 0] < basket.net_basis[1, 0] - basket.AI_T[1, 0])
+        np.testing.assert_array_equal(basket.ctd, [1])
+        np.testing.assert_array_equal(np.argmax(basket.implied_repo, axis=0), basket.ctd)
+
 
 class TestCurrencyContracts(unittest.TestCase):
     def test_cc(self):
@@ -92,6 +376,64 @@ class TestCurrencyContracts(unittest.TestCase):
         self.assertAlmostEqual(cc.V_t, 0.0492,
                                msg='Example 12.2 failed', delta=0.0492 * 0.01)
 
+    def test_cc_solvers(self):
+        # any missing value of the parity relation is recovered, for arrays of contracts too
+        values = dict(S_0=np.array([0.792, 1.1, 130.]), r_d=np.array([0.3, 2., -0.5]),
+                      r_f=np.array([1., 0.5, 0.1]), T_0=np.array([1., 0.5, 2.]))
+        cc = fc.CurrencyContracts(**values)
+        cc.calc()
+        for key in values:
+            cc = fc.CurrencyContracts(**dict(values, **{key: None}), F_0=cc.F_0)
+            cc.calc()
+            np.testing.assert_allclose(getattr(cc, key), values[key])
+        # the compiled solutions are reused
+        solvers = dict(fc._CIP_SOLVERS)
+        cc = fc.CurrencyContracts(S_0=0.792, r_d=0.3, r_f=1, T_0=1)
+        cc.calc()
+        self.assertEqual(fc._CIP_SOLVERS, solvers)
+
+    def test_cc_grid(self):
+        # two pairs, three tenors, rate curves per pair
+        cc = fc.CurrencyContracts.grid(S_t=[0.75, 110.], r_d_t=[[0.4, 0.5, 0.6], [0.1, 0.1, 0.2]],
+                                       r_f_t=[0.8, 0.9, 1.], T_t=[0.25, 0.5, 1], F_0=[[0.8], [109.]],
+                                       NA=1000, pip=[10000, 100])
+        self.assertEqual(cc.F_t.shape, (2, 3))
+        single = fc.CurrencyContracts(F_0=0.8, S_t=0.75, r_d_t=0.4, r_f_t=0.8, T_t=3/12)
+        single.calc()
+        self.assertAlmostEqual(cc.F_t[0, 0], single.F_t)
+        self.assertAlmostEqual(cc.V_t[0, 0], 1000 * single.V_t)
+        self.assertAlmostEqual(single.V_t, 0.0492, places=4)
+        # the book discounts at the foreign rate like calc and grid
+        book = fc.ForwardBook.from_arrays('currency', F_0=0.8, S_t=0.75, r_d_t=0.4, r_f_t=0.8, T_t=3/12)
+        book.price()
+        self.assertAlmostEqual(book[0].V_t, single.V_t)
+        self.assertAlmostEqual(book[0].F_t, single.F_t)
+        self.assertAlmostEqual(cc.F_t[1, 2], 110 * 1.01 / 1.002)
+        np.testing.assert_allclose(cc.points, (cc.F_t - [[0.75], [110]]) * [[10000], [100]])
+
+
+class TestCurrencyGraph(unittest.TestCase):
+    def test_graph(self):
+        market = fc.CurrencyGraph({'AUD/USD': 1.14, 'EUR/USD': 0.92, 'JPY/USD': 150., 'GBP/EUR': 0.86,
+                                   'CHF/GBP': 1.1, 'XAU/XAG': 0.01})
+        self.assertAlmostEqual(market.rate('AUD/EUR'), 1.14 / 0.92)
+        self.assertAlmostEqual(market.rate('USD', 'AUD'), 1 / 1.14)
+        self.assertEqual(market.path('AUD/CHF'), ('AUD', 'USD', 'EUR', 'GBP', 'CHF'))
+        self.assertAlmostEqual(market.rate('CHF/AUD') * market.rate('AUD/CHF'), 1)
+        np.testing.assert_allclose(market.rates(['JPY/GBP', 'XAG/XAU']), [150 / (0.86 * 0.92), 100])
+        self.assertAlmostEqual(market.convert(100, 'AUD', 'USD'), 100 / 1.14)
+        with self.assertRaises(ValueError):
+            market.rate('AUD/XAU')
+        # notional conversion and spot rates of currency contracts
+        cc = fc.CurrencyContracts(curr_pair='USD/AUD', NA=1e6, market=market)
+        self.assertAlmostEqual(cc.notional('EUR'), 1e6 * 0.92 / 1.14)
+        grid = fc.CurrencyContracts.grid(None, 0.5, 1., [0.5, 1], curr_pair=['USD/AUD', 'JPY/EUR'], market=market)
+        np.testing.assert_allclose(grid.S_t, [1 / 1.14, 150 / 0.92])
+        # and of currency swaps
+        cs = fc.CurrencySwap(na={'AUD': 1e8, 'USD': None}, curr_pair={'DC': 'USD', 'FC': 'AUD'}, market=market,
+                             r_fix={'AUD': 0.0277, 'USD': 0.0025}, pv={'NAD': [90, 180]})
+        self.assertAlmostEqual(cs.na['USD'], 1e8 / 1.14)
+
 
 class TestInterestRateSwapContracts(unittest.TestCase):
     def test_cc(self):
@@ -108,6 +450,54 @@ class TestInterestRateSwapContracts(unittest.TestCase):
         irs.calc()
         self.assertAlmostEqual(irs.v_t * 1e8, 3.375e6, msg='Example 13 failed', delta=3.375e6 * 0.01)
 
+    def test_book(self):
+        pv = [0.990099, 0.977876, 0.965136, 0.951529, 0.937467]
+        rates = fc.InterestRateSwap.par_rates(pv)
+        for k in range(1, 6):
+            irs = fc.InterestRateSwap(PV=pd.DataFrame({'Maturity': range(k), 'PV Factors': pv[:k]}))
+            irs.calc()
+            self.assertAlmostEqual(rates[k - 1], irs.r_fix)
+        self.assertAlmostEqual(fc.fixed_rate(pv), rates[-1])
+        # a book of swaps, Example 14 is the first one
+        values = fc.InterestRateSwap.value_book(pv, r_fix=[0.02, 0.01, rates[2]], n=[5, 2, 3], NA=[1e8, -1e6, 5e6])
+        self.assertAlmostEqual(values[0], 0.02e8 * np.sum(pv) - 1e8 * (1 - pv[-1]))
+        self.assertAlmostEqual(values[1], -1e6 * (0.01 * (pv[0] + pv[1]) - (1 - pv[1])))
+        self.assertAlmostEqual(values[2], 0)
+
+    def test_curve_dates(self):
+        # annual swap priced off a curve, valued 90 days later between two payment dates
+        yc = fc.YieldCurve.bootstrap(deposits=[[90, 180, 360], [2.5, 2.6, 2.8]], swaps=[[720, 1080], [3.0, 3.2]])
+        yc_t = fc.YieldCurve(yc.days, yc.pv(yc.days) * 0.999)
+        irs = fc.InterestRateSwap(PV=yc, PV_t=yc_t, dates=[360, 720, 1080], dates_t=[270, 630, 990])
+        irs.calc()
+        self.assertAlmostEqual(irs.r_fix, fc.fixed_rate(yc.pv([360, 720, 1080])))
+        pv_t = yc_t.pv([270, 630, 990])
+        self.assertAlmostEqual(irs.r_fix_t, (1 - pv_t[-1]) / pv_t.sum())
+        self.assertAlmostEqual(irs.v_t, (irs.r_fix - irs.r_fix_t) * pv_t.sum())
+
+    def test_incremental(self):
+        pv = np.array([0.990099, 0.977876, 0.965136, 0.951529, 0.937467])
+        r_fix, n, NA = [0.02, 0.01, 0.015, 0.013], [5, 2, 3, 5], [1e8, -1e6, 5e6, 2e6]
+        book = fc.SwapBook(pv, r_fix, n, NA)
+        np.testing.assert_allclose(book.v_t, fc.InterestRateSwap.value_book(pv, r_fix, n, NA))
+        self.assertAlmostEqual(book.value, book.v_t.sum())
+        # only nodes 2 and 4 move
+        moved = pv.copy()
+        moved[[1, 3]] = [0.975, 0.95]
+        v_t = book.update([1, 3], [0.975, 0.95])
+        np.testing.assert_allclose(v_t, fc.InterestRateSwap.value_book(moved, r_fix, n, NA))
+        self.assertAlmostEqual(book.value, v_t.sum(), places=6)
+        # a node named twice takes its last value
+        moved[1] = 0.95
+        v_t = book.update([1, 1], [0.9, 0.95])
+        np.testing.assert_allclose(v_t, fc.InterestRateSwap.value_book(moved, r_fix, n, NA))
+        self.assertAlmostEqual(book.value, v_t.sum(), places=6)
+        # or read from a new curve at the payment dates
+        yc = fc.YieldCurve(np.arange(360, 1801, 360), moved * 0.999)
+        book = fc.SwapBook(pv, r_fix, n, NA, dates=np.arange(360, 1801, 360))
+        v_t = book.update([0, 1, 2, 3, 4], curve=yc)
+        np.testing.assert_allclose(v_t, fc.InterestRateSwap.value_book(yc, r_fix, n, NA, dates=book.dates))
+
 
 class TestCurrencySwapContracts(unittest.TestCase):
     def test_cc(self):
@@ -128,6 +518,142 @@ class TestCurrencySwapContracts(unittest.TestCase):
                                88, msg='Example 15 failed',
                                delta=88 * 0.01)
 
+    def test_book(self):
+        nad = [90, 180, 270, 360]
+        spot_rates = {'NAD': nad, 'AUD': [2.50, 2.60, 2.70, 2.80], 'USD': [0.10, 0.15, 0.20, 0.25]}
+        cs = fc.CurrencySwap(na={'AUD': 1e8, 'USD': None}, curr_pair={'DC': 'USD', 'FC': 'AUD'}, spot_rates=spot_rates,
+                             exchange_rate={'AUD/USD': 1.140})
+        cs.calc()
+        self.assertAlmostEqual(cs.v_t, 0, places=6)
+        # half a year later with the AUD rates up and the AUD down
+        pv_t = {'NAD': [90, 180], 'AUD': [0.99, 0.98], 'USD': [0.9995, 0.999]}
+        cs.calc(pv_t=pv_t, market_t=fc.CurrencyGraph({'AUD/USD': 1.2}))
+        value_usd = cs.na['USD'] * (cs.r_fix['USD'] / 4 * (0.9995 + 0.999) + 0.999)
+        value_aud = 1e8 * (cs.r_fix['AUD'] / 4 * (0.99 + 0.98) + 0.98)
+        self.assertAlmostEqual(cs.v_t, value_usd - value_aud / 1.2, places=4)
+        self.assertAlmostEqual(cs.fx_delta, -value_aud)
+        # curves are read at the remaining payment days, here 60 and 150
+        aud = fc.YieldCurve.bootstrap(deposits=[nad, spot_rates['AUD']])
+        usd = fc.YieldCurve.bootstrap(deposits=[nad, spot_rates['USD']])
+        cs.calc(pv_t={'NAD': [60, 150], 'AUD': aud, 'USD': usd}, market_t=fc.CurrencyGraph({'AUD/USD': 1.2}))
+        from_curves = cs.v_t
+        cs.calc(pv_t={'NAD': [60, 150], 'AUD': aud.pv([60, 150]), 'USD': usd.pv([60, 150])},
+                market_t=fc.CurrencyGraph({'AUD/USD': 1.2}))
+        self.assertAlmostEqual(from_curves, cs.v_t, places=6)
+        # a book of swaps sharing the curves, at par worth 0
+        market = fc.CurrencyGraph({'AUD/USD': 1.14, 'EUR/USD': 0.92})
+        curves = {'AUD': fc.YieldCurve.bootstrap(deposits=[nad, spot_rates['AUD']]),
+                  'USD': fc.YieldCurve.bootstrap(deposits=[nad, spot_rates['USD']]),
+                  'EUR': fc.YieldCurve.bootstrap(deposits=[nad, [1, 1.1, 1.2, 1.3]])}
+        book = fc.CurrencySwapBook(DC=['USD', 'USD', 'EUR'], FC=['AUD', 'EUR', 'AUD'], NA=[1e8, 5e7, -2e7], n=[4, 4, 2],
+                                   curves=curves, market=market, reporting='EUR')
+        book.calc()
+        np.testing.assert_allclose(book.fixed_pay_FC[0], cs.fixed_pay['AUD'])
+        np.testing.assert_allclose(book.fixed_pay_DC[0], cs.fixed_pay['USD'])
+        np.testing.assert_allclose(book.NA_DC, [1e8 / 1.14, 5e7 / 0.92, -2e7 * 0.92 / 1.14])
+        np.testing.assert_allclose(book.v_t, 0, atol=1e-6)
+
+
+class TestEquitySwapBook(unittest.TestCase):
+    def test_equity_swap(self):
+        self.assertAlmostEqual(fc.equity_swap(position='re', reset='quarterly', NA=5000000, pay_fixed=0.4,
+                                              equity_return=-6), -320000)
+        book = fc.EquitySwapBook(NA=[1e6, 2e6, 1e6, 5e5], equity=[0, 1, 0, 1], leg=['price', 'total', 'price', 'return'],
+                                 pay_fixed=[2, np.nan, 2, 1], spread=[0, 0.5, 0, 0], start=[0, 1, 0, 2], n=[3, 2, 4, 4],
+                                 variable=[False, False, True, False], prices=[[100, 105, 103, 110], [50, 49, 52, 53]],
+                                 dividends=[[0, 0, 0], [1, 0, 1]], returns=[[5, -1.9, 6.8], [-2, 6.1, 1.9]],
+                                 libor=[1, 1.2, 1.4, 1.5], s_t=[112, 54], days=30,
+                                 curve=fc.YieldCurve([90, 180, 360], [0.997, 0.994, 0.988]))
+        book.calc()
+        self.assertEqual(book.cash_flows.shape, (4, 3))
+        # price return against the fixed rate, total return against Libor plus spread
+        self.assertAlmostEqual(book.cash_flows[0, 1], 1e6 * ((103 / 105 - 1) - 0.02 / 4))
+        self.assertAlmostEqual(book.cash_flows[1, 1], 2e6 * ((52 / 49 - 1) - 0.017 / 4))
+        self.assertAlmostEqual(book.cash_flows[1, 2], 2e6 * ((54 / 52 - 1) - 0.019 / 4))
+        self.assertAlmostEqual(book.cash_flows[3, 2], 5e5 * (0.019 - 0.01 / 4))
+        np.testing.assert_array_equal(book.cash_flows[[1, 3], 0], 0)
+        # the variable notional follows the index
+        np.testing.assert_allclose(book.notional[2], [1e6, 1.05e6, 1.03e6])
+        # matured swaps are worth 0, the others receive the index and pay a bond
+        pv = 0.997 ** (60 / 90)
+        self.assertEqual(book.v_t[0], 0)
+        self.assertAlmostEqual(book.v_t[2], 1.1e6 * 112 / 110 - 1.1e6 * (0.02 / 4 * pv + pv))
+        # a floating leg with a spread is worth par plus the spread annuity over the remaining dates
+        curve = fc.YieldCurve([90, 180, 360], [0.997, 0.994, 0.988])
+        book = fc.EquitySwapBook(NA=1e6, pay_fixed=np.nan, spread=1, n=4, prices=[[100, 105]], libor=[1, 1.2],
+                                 s_t=[106], days=30, curve=curve)
+        book.calc()
+        dates = curve.pv([60, 150, 240])
+        floating = 1e6 * (1 + 0.022 / 4) * dates[0] + 1e6 * 0.01 / 4 * (dates[1] + dates[2])
+        self.assertAlmostEqual(book.v_t[0], 1e6 * 106 / 105 - floating)
+        # return-only books take s_t as the equity return since the last reset
+        book = fc.EquitySwapBook(NA=1e6, leg='return', pay_fixed=2, n=4, returns=[[5, -1.9, 6.8]], s_t=[1.5],
+                                 days=30, curve=fc.YieldCurve([90, 180, 360], [0.997, 0.994, 0.988]))
+        book.calc()
+        self.assertAlmostEqual(book.v_t[0], 1e6 * 1.015 - 1e6 * (0.02 / 4 * pv + pv))
+
+
+class TestRisk(unittest.TestCase):
+    @staticmethod
+    def bumped(curve, node, bp=1):
+        log_pv = curve.log_pv.copy()
+        log_pv[node] -= bp / 1e4 * curve.days[node] / curve.ntd
+        return fc.YieldCurve(curve.days, np.exp(log_pv), curve.interpolation, curve.ntd)
+
+    def test_dv01(self):
+        yc = fc.YieldCurve.bootstrap(deposits=[[90, 180, 360], [2.5, 2.6, 2.8]], swaps=[[720, 1080], [3.0, 3.2]])
+        dates = np.arange(360, 1081, 360)
+        r_fix, n, NA = [0.03, 0.025, 0.032], [3, 2, 3], [1e8, -5e7, 2e7]
+        dv01 = fc.InterestRateSwap.risk(yc, dates, r_fix, n, NA)
+        self.assertEqual(dv01.shape, (3, 5))
+        base = fc.InterestRateSwap.value_book(yc, r_fix, n, NA, dates=dates)
+        for node in range(5):
+            bumped = fc.InterestRateSwap.value_book(self.bumped(yc, node), r_fix, n, NA, dates=dates)
+            np.testing.assert_allclose(dv01.iloc[:, node], bumped - base, atol=1e-6)
+        # receiving fixed gains when rates fall, nodes before the first payment do not matter
+        self.assertTrue(dv01.iloc[0].sum() < 0)
+        np.testing.assert_allclose(dv01.iloc[:, :2], 0, atol=1e-6)
+        durations = fc.key_rate_durations(dv01, base)
+        np.testing.assert_allclose(durations.iloc[0], -dv01.iloc[0] / base[0] * 1e4)
+        # FRAs and fixed income forwards bump the same nodes
+        NA, FRA_0, h, m = [1e6, -2e6], [2.7, 2.9], [90, 180], [90, 180]
+        dv01 = fc.FRA.risk(yc, NA, FRA_0, h, m)
+        value = lambda c, h, m, f: 1e6 * (c.pv(h) - c.pv(h + m) * (1 + f / 100 * m / 360))
+        for node in range(5):
+            self.assertAlmostEqual(dv01.iloc[0, node], value(self.bumped(yc, node), 90, 90, 2.7) - value(yc, 90, 90, 2.7))
+        self.assertTrue(dv01.iloc[0].sum() > 0)
+        dv01 = fc.FixedIncomeForward.risk(yc, B_0=[1.02], AI_0=[0.01], AI_T=[0.02], FVCI=[0], F_0=[1.01], T=[0.5])
+        np.testing.assert_allclose(dv01.to_numpy()[0], [0, -1.03 * (self.bumped(yc, 1).pv(180) - yc.pv(180)), 0, 0, 0],
+                                   atol=1e-12)
+
+    def test_currency_swap(self):
+        nad = [90, 180, 270, 360]
+        market = fc.CurrencyGraph({'AUD/USD': 1.14, 'EUR/USD': 0.92})
+        curves = {'AUD': fc.YieldCurve.bootstrap(deposits=[nad, [2.50, 2.60, 2.70, 2.80]]),
+                  'USD': fc.YieldCurve.bootstrap(deposits=[nad, [0.10, 0.15, 0.20, 0.25]]),
+                  'EUR': fc.YieldCurve.bootstrap(deposits=[nad, [1, 1.1, 1.2, 1.3]])}
+        kwargs = dict(DC=['USD', 'USD', 'EUR'], FC=['AUD', 'EUR', 'AUD'], NA=[1e8, 5e7, -2e7], n=[4, 4, 2],
+                      r_fix_DC=[0.003, 0.002, 0.012], r_fix_FC=[0.027, 0.012, 0.026], reporting='EUR')
+        book = fc.CurrencySwapBook(curves=curves, market=market, **kwargs)
+        book.calc()
+        dv01 = book.risk()
+        self.assertEqual(dv01.shape, (3, 12))
+        for currency in ('AUD', 'EUR', 'USD'):
+            for node in range(4):
+                bumped = fc.CurrencySwapBook(curves=dict(curves, **{currency: self.bumped(curves[currency], node)}),
+                                             market=market, NA_DC=book.NA_DC, **kwargs)
+                bumped.calc()
+                np.testing.assert_allclose(dv01[currency].iloc[:, node], bumped.v_t - book.v_t, atol=1e-6)
+        # the USD/AUD swap only depends on the USD and AUD curves
+        np.testing.assert_allclose(dv01['EUR'].iloc[0], 0)
+        # the FX delta is the value of the FC leg, the reporting rate held fixed
+        usd_per_aud = market.rate('USD', 'AUD')
+        moved = fc.CurrencySwapBook(curves=curves, market=fc.CurrencyGraph({'AUD/USD': 1 / (usd_per_aud + 1e-6),
+                                                                            'EUR/USD': 0.92}),
+                                    NA_DC=book.NA_DC, **kwargs)
+        moved.calc()
+        self.assertAlmostEqual(book.fx_delta[0], (moved.v_t[0] - book.v_t[0]) / 1e-6, delta=abs(book.fx_delta[0]) * 1e-4)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,5 +1,7 @@
 import unittest
 import src.level2.derivatives.forward_commitments as fc
+import src.level2.derivatives.valuation_contingent_claims as vcc
+import numpy as np
 
 
 # Testing CFA II 2020 Reading 38 :Valuation of Contingent Claims on curriculum examples
@@ -72,6 +74,112 @@ class TestFixedIncome(unittest.TestCase):
                                msg='Example 10 failed', delta=14998.50*0.01)
 
 
+class TestBinomialOption(unittest.TestCase):
+    def test_binomial(self):
+        # two period put with u = 1.2 and d = 0.8
+        opt = vcc.BinomialOption(s_0=50, x=52, T=2, r_c=5, u=1.2, d=0.8, steps=2, option='put',
+                                 exercise=['european', 'american'])
+        opt.price()
+        np.testing.assert_almost_equal(opt.v_0, [4.1923, 5.0894], decimal=3)
+        # chain of strikes and expiries, American calls without benefits equal European calls
+        opt = vcc.BinomialOption(s_0=100, x=[90, 100, 110], T=[0.5, 1, 2], r_c=5, sigma=25, steps=500,
+                                 exercise='american', chunk_size=2)
+        opt.price()
+        eur = vcc.BinomialOption(s_0=100, x=[90, 100, 110], T=[0.5, 1, 2], r_c=5, sigma=25, steps=500)
+        eur.price()
+        np.testing.assert_almost_equal(opt.v_0, eur.v_0, decimal=10)
+        self.assertAlmostEqual(eur.v_0[1], 12.336, places=1)
+        # early exercise premium of American puts with recombining lattice
+        put = vcc.BinomialOption(s_0=100, x=[90, 100, 110], T=1, r_c=5, sigma=25, steps=500, option='put',
+                                 exercise=['european', 'american', 'american'], gamma_c=2)
+        put.price()
+        self.assertTrue(np.all(np.diff(put.v_0) > 0))
+        # an option whose lattice admits arbitrage does not discard the rest of the chain
+        opt = vcc.BinomialOption(s_0=100, x=100, T=1, r_c=5, sigma=[0.5, 20, 25], steps=100)
+        opt.price()
+        valid = vcc.BinomialOption(s_0=100, x=100, T=1, r_c=5, sigma=[20, 25], steps=100)
+        valid.price()
+        self.assertTrue(np.isnan(opt.v_0[0]))
+        np.testing.assert_array_equal(opt.v_0[1:], valid.v_0)
+
+
+class TestBlackScholesMerton(unittest.TestCase):
+    def test_bsm(self):
+        bsm = vcc.BlackScholesMerton(s_0=100, x=100, T=1, r_c=5, sigma=20, option=['call', 'put'])
+        bsm.price()
+        np.testing.assert_almost_equal(bsm.v_0, [10.4506, 5.5735], decimal=4)
+        np.testing.assert_almost_equal(bsm.delta, [0.6368, -0.3632], decimal=4)
+        self.assertAlmostEqual(bsm.gamma[0], 0.018762, places=6)
+        self.assertAlmostEqual(bsm.vega[1], 0.37524, places=5)
+        np.testing.assert_almost_equal(bsm.theta, [-6.4140, -1.6579], decimal=4)
+        np.testing.assert_almost_equal(bsm.rho, [0.5323, -0.4189], decimal=4)
+        # converges to the binomial lattice with benefits
+        bsm = vcc.BlackScholesMerton(s_0=100, x=95, T=0.7, r_c=4, sigma=30, gamma_c=2, option='put')
+        bsm.price()
+        lattice = vcc.BinomialOption(s_0=100, x=95, T=0.7, r_c=4, sigma=30, gamma_c=2, option='put', steps=2000)
+        lattice.price()
+        self.assertAlmostEqual(bsm.v_0[0], lattice.v_0[0], places=2)
+
+
+class TestMonteCarloOption(unittest.TestCase):
+    def test_monte_carlo(self):
+        bsm = vcc.BlackScholesMerton(s_0=100, x=100, T=1, r_c=5, sigma=20)
+        bsm.price()
+        kwargs = dict(s_0=100, x=100, T=1, r_c=5, sigma=20, steps=12, n_paths=40000, chunk_size=7000, seed=7)
+        plain = vcc.MonteCarloOption(**kwargs)
+        plain.price()
+        self.assertLess(abs(plain.v_0 - bsm.v_0[0]), 4 * plain.se)
+        reduced = vcc.MonteCarloOption(antithetic=True, control_variate=True, **kwargs)
+        reduced.price()
+        self.assertLess(abs(reduced.v_0 - bsm.v_0[0]), 4 * reduced.se)
+        self.assertLess(reduced.se, plain.se / 2)
+        # independent streams per chunk, the result does not depend on the number of processes
+        pooled = vcc.MonteCarloOption(antithetic=True, control_variate=True, workers=2, **kwargs)
+        pooled.price()
+        self.assertEqual(pooled.v_0, reduced.v_0)
+        # path dependent payoffs
+        asian = vcc.MonteCarloOption(payoff='asian', **kwargs)
+        asian.price()
+        lookback = vcc.MonteCarloOption(payoff='lookback', **kwargs)
+        lookback.price()
+        self.assertTrue(asian.v_0 < plain.v_0 < lookback.v_0)
+        out = vcc.MonteCarloOption(payoff='barrier', barrier=120, barrier_type='up-and-out', **kwargs)
+        out.price()
+        knock_in = vcc.MonteCarloOption(payoff='barrier', barrier=120, barrier_type='up-and-in', **kwargs)
+        knock_in.price()
+        self.assertAlmostEqual(out.v_0 + knock_in.v_0, plain.v_0, places=10)
+
+
+class TestImpliedVolatility(unittest.TestCase):
+    def test_implied_volatility(self):
+        sigma = np.array([10, 20, 35, 60, 90])
+        kwargs = dict(s_0=100, x=[80, 95, 100, 110, 130], T=[0.25, 0.5, 1, 2, 3], r_c=3, gamma_c=1,
+                      option=['put', 'call', 'call', 'put', 'call'])
+        bsm = vcc.BlackScholesMerton(sigma=sigma, **kwargs)
+        bsm.price()
+        iv = vcc.ImpliedVolatility(v_0=bsm.v_0, **kwargs)
+        iv.calc()
+        np.testing.assert_almost_equal(iv.sigma, sigma, decimal=3)
+        self.assertTrue(np.all(iv.converged))
+        # prices without implied volatility fail without iterations
+        iv = vcc.ImpliedVolatility(v_0=[200, -1, 10.4506], s_0=100, x=100, T=1, r_c=5)
+        iv.calc()
+        np.testing.assert_array_equal(iv.converged, [False, False, True])
+        np.testing.assert_array_equal(iv.iterations[:2], [2, 2])
+        self.assertAlmostEqual(iv.sigma[2], 20, places=3)
+        # American options on the lattice take secant steps
+        lattice = vcc.BinomialOption(s_0=100, x=[90, 110], T=1, r_c=5, sigma=[25, 35], option='put',
+                                     exercise='american', steps=100)
+        lattice.price()
+        iv = vcc.ImpliedVolatility(v_0=lattice.v_0, pricer=vcc.BinomialOption, s_0=100, x=[90, 110], T=1, r_c=5,
+                                   option='put', exercise='american', steps=100, tol=1e-7)
+        iv.calc()
+        np.testing.assert_almost_equal(iv.sigma, [25, 35], decimal=4)
+        # the default bracket starts above the lowest volatility of an arbitrage-free lattice
+        self.assertTrue(np.all(iv.converged))
+        np.testing.assert_almost_equal(vcc.BinomialOption.min_sigma(T=1, r_c=5, steps=100), 0.5)
+
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -2,6 +2,7 @@ import unittest
 
 from src.level2.portfolio_managment import multifactor_models
 import pandas as pd
+import numpy as np
 
 
 
@@ -19,7 +20,11 @@ class TestAssociates(unittest.TestCase):
                 }
         df = pd.DataFrame(data, columns=['Portfolio', 'Expected Return', 'Factor Sensitivity'])
         output = multifactor_models.check_arbitrage(df)
-        self.assertAlmostEqual(output, 'A', places=2, msg='Example 1.1 failed')
+        self.assertEqual(list(output['no_arbitrage']['Portfolio']), ['A', 'B', 'C'], msg='Example 2 failed')
+        self.assertEqual(list(output['arbitrage']['Portfolio']), ['D'], msg='Example 2 failed')
+        self.assertAlmostEqual(output['risk_free'], 0.05, places=10)
+        self.assertAlmostEqual(output['premium'], 0.05, places=10)
+        self.assertAlmostEqual(output['alpha'][3], 0.0075, places=10)
 
         # Example 3
 
@@ -34,6 +39,21 @@ class TestAssociates(unittest.TestCase):
         portfolio.return_sym()
         portfolio.return_value(F_INFL=0.01, F_GDP=0, eps_MANM=0.05, eps_NXT=0.05)
 
-        self.assertAlmostEqual(output, 'A', places=2, msg='Example 1.1 failed')
+        self.assertEqual(output['arbitrage'].index[0], 3, msg='Example 2 failed')
+
+    def test_arbitrage_book(self):
+        # a large book on the line 0.02 + 0.06 * beta with a few mispriced portfolios
+        beta = np.linspace(0.1, 2.5, 3000)
+        expected = 0.02 + 0.06 * beta
+        expected[[0, 7, 2999]] += [0.01, -0.004, 0.002]
+        df = pd.DataFrame({'Portfolio': ['P%d' % i for i in range(3000)], 'Expected Return': expected,
+                           'Factor Sensitivity': beta})
+        output = multifactor_models.check_arbitrage(df)
+        self.assertEqual(list(output['arbitrage'].index), [0, 7, 2999])
+        self.assertEqual(len(output['no_arbitrage']), 2997)
+        self.assertAlmostEqual(output['risk_free'], 0.02, places=10)
+        self.assertAlmostEqual(output['premium'], 0.06, places=10)
+
+
 if __name__ == '__main__':
     unittest.main()